@@ -0,0 +1,417 @@
+# benchmarks.py
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from redis.connection import Connection
+
+from cache_manager import CacheManager, JSONSerializer, VectorSerializer, cached
+
+
+@contextmanager
+def count_round_trips():
+    """Count every packet written to Redis (commands, pipelines and PINGs)."""
+    counter = {"round_trips": 0}
+    original = Connection.send_packed_command
+
+    def send_packed_command(self, command, check_health=True):
+        counter["round_trips"] += 1
+        return original(self, command, check_health)
+
+    Connection.send_packed_command = send_packed_command
+    try:
+        yield counter
+    finally:
+        Connection.send_packed_command = original
+
+
+def bench_cached_round_trips(calls=200):
+    """Compare Redis round trips per @cached call: shared pool vs. per-call client."""
+    shared = CacheManager(fallback_backend=None)
+    if not shared.is_available():
+        print("Redis is not available, skipping")
+        return
+
+    shared.clear_pattern("bench_rt:*")
+
+    @cached(prefix="bench_rt", ttl=60, cache=shared)
+    def pooled(i):
+        return {"value": i}
+
+    def per_call(i):
+        # Previous behaviour: a brand-new client (and PING) for every call
+        cache = CacheManager(fallback_backend=None)
+        key = cache._generate_key("bench_rt", i)
+        result = cache.get(key)
+        if result is None:
+            result = {"value": i}
+            cache.set(key, result, 60)
+        cache.close()
+        return result
+
+    for label, func in (("per-call client", per_call), ("shared pool", pooled)):
+        shared.clear_pattern("bench_rt:*")
+        for phase in ("miss", "hit"):
+            with count_round_trips() as counter:
+                start = time.perf_counter()
+                for i in range(calls):
+                    func(i)
+                elapsed = time.perf_counter() - start
+            print(
+                f"{label:<16} {phase:<4} "
+                f"{counter['round_trips'] / calls:5.2f} round trips/call, "
+                f"{elapsed / calls * 1e6:8.1f} us/call"
+            )
+
+    shared.clear_pattern("bench_rt:*")
+
+
+def bench_embedding_codec(dim=1536, rounds=2000):
+    """Compare payload size and encode/decode time of embedding codecs."""
+    vector = np.random.default_rng(0).standard_normal(dim).astype(np.float32)
+    codecs = (
+        ("json", JSONSerializer(), vector.tolist()),
+        ("float32", VectorSerializer("float32"), vector),
+        ("float16", VectorSerializer("float16"), vector),
+        ("int8", VectorSerializer("int8"), vector),
+    )
+    for label, codec, value in codecs:
+        payload = codec.dumps(value)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            codec.dumps(value)
+        encode = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(rounds):
+            codec.loads(payload)
+        decode = time.perf_counter() - start
+        print(
+            f"{label:<8} {len(payload):7d} bytes, "
+            f"encode {encode / rounds * 1e6:8.1f} us, "
+            f"decode {decode / rounds * 1e6:8.1f} us"
+        )
+
+
+def bench_cache_backends(calls=2000):
+    """Measure get/set/get_many latency on each cache backend (L1 disabled)."""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in ("redis", "memory", "sqlite"):
+            cache = CacheManager(
+                backend=backend,
+                fallback_backend=None,
+                sqlite_path=f"{tmp}/bench.sqlite3",
+                local_cache_size=0
+            )
+            if not cache.is_available():
+                print(f"{backend:<7} not available, skipping")
+                continue
+            keys = [f"bench_backend:{i}" for i in range(calls)]
+            value = {"id": "node_1", "score": 0.9, "metadata": {"name": "Hoi An"}}
+
+            start = time.perf_counter()
+            for key in keys:
+                cache.set(key, value, 60)
+            set_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for key in keys:
+                cache.get(key)
+            get_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for i in range(0, calls, 100):
+                cache.get_many(keys[i:i + 100])
+            get_many_time = time.perf_counter() - start
+
+            print(
+                f"{backend:<7} set {set_time / calls * 1e6:7.1f} us, "
+                f"get {get_time / calls * 1e6:7.1f} us, "
+                f"get_many {get_many_time / calls * 1e6:7.1f} us/key"
+            )
+            cache.clear_pattern("bench_backend:*")
+            cache.close()
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Local stand-in for /v1/embeddings that throttles above a fixed request rate."""
+
+    max_per_second = 50
+    window = {"start": 0.0, "count": 0}
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window["start"] >= 1.0:
+                self.window.update(start=now, count=0)
+            self.window["count"] += 1
+            throttled = self.window["count"] > self.max_per_second
+        if throttled:
+            self._send(429, {"error": {"message": "Rate limit reached", "type": "requests"}}, {"retry-after-ms": "200"})
+            return
+        time.sleep(0.01)
+        data = [
+            {"object": "embedding", "index": i, "embedding": [0.0] * 8}
+            for i in range(len(body["input"]))
+        ]
+        self._send(200, {
+            "object": "list",
+            "data": data,
+            "model": body["model"],
+            "usage": {"prompt_tokens": 1, "total_tokens": 1}
+        })
+
+    def _send(self, status, payload, headers=None):
+        raw = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, *args):
+        pass
+
+
+def bench_openai_rate_limiter(requests=300, workers=32):
+    """Drive RateLimitedOpenAI against a throttling local fake server."""
+    from services.openai_client import RateLimitedOpenAI
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        for label, rpm in (("no client limit", 10 ** 9), ("40 req/s budget", 2400)):
+            client = RateLimitedOpenAI(
+                api_key="fake",
+                base_url=f"http://127.0.0.1:{server.server_port}/v1",
+                requests_per_minute=rpm,
+                max_retries=10
+            )
+            # Start with an empty bucket so the budget applies from the first request
+            client._limits_for("fake-embed").requests.drain()
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(
+                    lambda i: client.create_embeddings("fake-embed", [f"text {i}"]),
+                    range(requests)
+                ))
+            elapsed = time.perf_counter() - start
+            metrics = client.metrics()
+            print(
+                f"{label:<16} {requests / elapsed:6.1f} req/s, "
+                f"throttled {metrics['throttled']}, retries {metrics['retries']}, "
+                f"failures {metrics['failures']}, "
+                f"concurrency limit {metrics['concurrency_limits']['fake-embed']}, "
+                f"paced at {metrics['request_rates']['fake-embed']} req/s"
+            )
+    finally:
+        server.shutdown()
+
+
+def bench_embedding_backends(queries=200):
+    """Measure uncached single-query embedding latency of the local backends."""
+    from services.embedding_backends import get_embedding_backend
+
+    texts = [f"things to do in Hoi An day {i}" for i in range(queries)]
+    for model in ("hash", "local:sentence-transformers/all-MiniLM-L6-v2"):
+        try:
+            backend = get_embedding_backend(model)
+        except ImportError as e:
+            print(f"{model:<48} skipped ({e})")
+            continue
+        backend.embed(texts[:1])
+        start = time.perf_counter()
+        for text in texts:
+            backend.embed([text])
+        elapsed = time.perf_counter() - start
+        print(f"{model:<48} {elapsed / queries * 1e3:7.2f} ms/query")
+
+
+def bench_quantization_recall(corpus=5000, queries=100, dim=1536):
+    """Recall@10 vs. bytes/vector for each compression (stored vectors if available)."""
+    from services.quantization import evaluate_recall
+
+    rng = np.random.default_rng(0)
+    matrix = None
+    import config
+    from pathlib import Path
+    from services.embedding_store import EmbeddingStore
+    store_dir = Path(getattr(config, 'EMBEDDING_STORE_DIR', None) or ".cache/embeddings") / config.EMBED_MODEL
+    if (store_dir / "meta.json").exists():
+        store = EmbeddingStore(str(store_dir))
+        if len(store) >= 1000:
+            matrix = np.asarray(store._view())
+    if matrix is None:
+        # Clustered synthetic vectors: real embeddings are far from isotropic
+        centers = rng.standard_normal((50, dim)).astype(np.float32)
+        matrix = centers[rng.integers(0, 50, corpus)] + 0.6 * rng.standard_normal((corpus, dim)).astype(np.float32)
+        print(f"Using {corpus} synthetic {dim}-d vectors")
+    else:
+        print(f"Using {len(matrix)} stored vectors")
+    picks = rng.choice(len(matrix), queries, replace=False)
+    probes = matrix[picks] + 0.1 * rng.standard_normal(matrix[picks].shape).astype(np.float32)
+
+    for row in evaluate_recall(matrix, probes, top_k=10):
+        print(
+            f"{row['config']:<18} {row['bytes_per_vector']:7.0f} bytes/vector, "
+            f"recall@10 {row['recall']:.3f}, {row['ms_per_query']:6.2f} ms/query"
+        )
+
+
+def bench_local_vector_index(corpus=100000, queries=100, dim=256):
+    """Recall@10 and latency of the local index: brute force, compressed with rescoring and IVF."""
+    import tempfile
+    from services.local_vector_index import LocalVectorIndex
+    from services.quantization import l2_normalize
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((50, dim)).astype(np.float32)
+    matrix = centers[rng.integers(0, 50, corpus)] + 0.6 * rng.standard_normal((corpus, dim)).astype(np.float32)
+    probes = matrix[:queries] + 0.1 * rng.standard_normal((queries, dim)).astype(np.float32)
+    normalized = l2_normalize(matrix)
+    exact = [set(np.argsort(-(normalized @ l2_normalize(probe)))[:10].tolist()) for probe in probes]
+
+    runs = (
+        ("brute force", corpus + 1, None),
+        ("int8+rescore", corpus + 1, "int8"),
+        ("binary+rescore", corpus + 1, "binary"),
+        ("ivf", 0, None),
+    )
+    for label, threshold, compression in runs:
+        with tempfile.TemporaryDirectory() as path:
+            index = LocalVectorIndex(os.path.join(path, "index"), ivf_threshold=threshold, compression=compression)
+            index.upsert({"id": str(i), "values": vector} for i, vector in enumerate(matrix))
+            index.save()
+            start = time.perf_counter()
+            hits = 0
+            for probe, truth in zip(probes, exact):
+                hits += len(truth & {int(match["id"]) for match in index.query(probe, 10)})
+            elapsed = time.perf_counter() - start
+        print(f"{label:<14} recall@10 {hits / (queries * 10):.3f}, {elapsed / queries * 1e3:6.2f} ms/query")
+
+
+def bench_bm25(nodes=20000, queries=1000):
+    """BM25 build time, index size and per-query latency (built index if available)."""
+    import config
+    from services.bm25_index import BM25Index, load_bm25_index
+
+    index = load_bm25_index(getattr(config, 'BM25_INDEX_PATH', ".cache/bm25"))
+    rng = np.random.default_rng(0)
+    words = np.array([f"w{i}" for i in range(5000)])
+    if index is None:
+        start = time.perf_counter()
+        index = BM25Index.from_nodes(
+            {
+                "id": f"node_{i}",
+                "name": " ".join(rng.choice(words, 3)),
+                "description": " ".join(rng.choice(words, 40)),
+                "city": str(rng.choice(["Hoi An", "Ha Noi", "Da Nang", "Hue", "Sa Pa"])),
+            }
+            for i in range(nodes)
+        )
+        print(f"Built synthetic index of {nodes} nodes in {time.perf_counter() - start:.2f}s")
+    else:
+        words = np.array(list(index.terms))
+        print(f"Using built index of {len(index)} nodes")
+    size = sum(np.asarray(getattr(index, name)).nbytes for name in BM25Index.ARRAYS)
+    print(f"postings {size / 1e6:.2f} MB for {len(index.terms)} terms")
+
+    texts = [" ".join(rng.choice(words, 4)) for _ in range(queries)]
+    start = time.perf_counter()
+    for text in texts:
+        index.search(text, 10)
+    print(f"{(time.perf_counter() - start) / queries * 1e3:.3f} ms/query")
+
+
+_IMPORT_TIME_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import hybrid_chat
+imported = time.perf_counter() - start
+from lazy_proxy import initialize_all, resolve
+from cache_manager import cache_manager
+from services.azure_blob_service import azure_blob
+from services.embedding_service import embedding_service
+from services.graph_db_service import graph_db_service
+from services.vector_db_service import vector_db_service
+proxies = {
+    "cache_manager": cache_manager,
+    "embedding_service": embedding_service,
+    "vector_db_service": vector_db_service,
+    "graph_db_service": graph_db_service,
+    "azure_blob": azure_blob,
+}
+start = time.perf_counter()
+if sys.argv[1] == "parallel":
+    results = initialize_all(proxies)
+else:
+    results = initialize_all(proxies, max_workers=1)
+print(json.dumps({"import_s": imported, "init_s": time.perf_counter() - start, "services": results}))
+"""
+
+
+def bench_import_time(runs=3):
+    """Time `import hybrid_chat` in fresh interpreters, then service start-up serially vs. in parallel."""
+    for mode in ("serial", "parallel"):
+        imports, inits = [], []
+        for _ in range(runs):
+            completed = subprocess.run(
+                [sys.executable, "-c", _IMPORT_TIME_SCRIPT, mode],
+                capture_output=True, text=True
+            )
+            if completed.returncode != 0:
+                print(f"{mode}: failed\n{completed.stderr.strip().splitlines()[-1]}")
+                return
+            report = json.loads(completed.stdout.strip().splitlines()[-1])
+            imports.append(report["import_s"])
+            inits.append(report["init_s"])
+        failed = [name for name, result in report["services"].items() if not result["ok"]]
+        print(
+            f"{mode:<9} import {min(imports) * 1e3:8.1f} ms, "
+            f"first-use init of all services {min(inits) * 1e3:8.1f} ms"
+            + (f" (unavailable: {', '.join(failed)})" if failed else "")
+        )
+
+
+BENCHMARKS = {
+    "cached_round_trips": bench_cached_round_trips,
+    "embedding_codec": bench_embedding_codec,
+    "cache_backends": bench_cache_backends,
+    "openai_rate_limiter": bench_openai_rate_limiter,
+    "embedding_backends": bench_embedding_backends,
+    "quantization_recall": bench_quantization_recall,
+    "import_time": bench_import_time,
+    "local_vector_index": bench_local_vector_index,
+    "bm25": bench_bm25,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run cache and retrieval benchmarks")
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run (default: all): {', '.join(BENCHMARKS)}")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    for name in args.names or BENCHMARKS:
+        print(f"\n== {name} ==")
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
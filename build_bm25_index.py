@@ -0,0 +1,36 @@
+# build_bm25_index.py
+import argparse
+import json
+import time
+
+import config
+from logger import get_logger
+from services.bm25_index import BM25Index
+
+logger = get_logger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the local BM25 index over graph nodes")
+    parser.add_argument(
+        "--input",
+        help="Local JSON dataset (default: download the dataset blob)"
+    )
+    parser.add_argument("--output", default=getattr(config, 'BM25_INDEX_PATH', ".cache/bm25"))
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, encoding="utf-8") as f:
+            nodes = json.load(f)
+    else:
+        from data_loader import DataLoader
+        nodes = DataLoader().load_data()
+
+    start = time.perf_counter()
+    index = BM25Index.from_nodes(node for node in nodes if node.get("id"))
+    index.save(args.output)
+    print(f"Indexed {len(index)} nodes ({len(index.terms)} terms) in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+
+def _to_bytes(value: Any) -> bytes:
+    """Store values the way Redis returns them (bytes)."""
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, (bytearray, memoryview)):
+        return bytes(value)
+    return str(value).encode("utf-8")
+
+
+def _expires_at(ex: Optional[float], px: Optional[int]) -> Optional[float]:
+    if ex is not None:
+        return time.time() + ex
+    if px is not None:
+        return time.time() + px / 1000
+    return None
+
+
+def to_fnmatch(pattern: str) -> str:
+    """Translate a Redis glob for fnmatch, which spells negated sets [!...] not [^...]."""
+    return pattern.replace("[^", "[!")
+
+
+def _decode(name: Any) -> str:
+    return name.decode("utf-8") if isinstance(name, bytes) else name
+
+
+class _Pipeline:
+    """Queue commands and run them together, mirroring redis-py pipelines."""
+
+    def __init__(self, client: "StandInClient"):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name: str):
+        method = getattr(self.client, name)
+
+        def queue(*args, **kwargs):
+            self.commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self) -> List[Any]:
+        commands, self.commands = self.commands, []
+        return [method(*args, **kwargs) for method, args, kwargs in commands]
+
+
+class StandInClient:
+    """
+    Base for in-process Redis stand-ins.
+
+    Implements the subset of the redis-py client API used by CacheManager
+    on top of four storage primitives: _load, _store, _remove and _keys.
+    Expiry times are wall-clock timestamps; None means no expiry.
+    """
+
+    def _load(self, key: str) -> Optional[Tuple[bytes, Optional[float]]]:
+        raise NotImplementedError
+
+    def _store(self, key: str, value: bytes, expires_at: Optional[float]):
+        raise NotImplementedError
+
+    def _remove(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def _keys(self) -> List[str]:
+        raise NotImplementedError
+
+    def _live(self, key: str) -> Optional[Tuple[bytes, Optional[float]]]:
+        entry = self._load(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            self._remove(key)
+            return None
+        return entry
+
+    def ping(self) -> bool:
+        return True
+
+    def pipeline(self, transaction: bool = True) -> _Pipeline:
+        return _Pipeline(self)
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._live(name)
+        return entry[0] if entry is not None else None
+
+    def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self.get(key) for key in keys]
+
+    def set(
+        self,
+        name: str,
+        value: Any,
+        ex: Optional[float] = None,
+        px: Optional[int] = None,
+        nx: bool = False
+    ) -> Optional[bool]:
+        expires_at = _expires_at(ex, px)
+        with self._lock:
+            if nx and self._live(name) is not None:
+                return None
+            self._store(name, _to_bytes(value), expires_at)
+        return True
+
+    def setex(self, name: str, time_: float, value: Any) -> bool:
+        return self.set(name, value, ex=time_)
+
+    def expire(self, name: str, time_: float) -> bool:
+        """Set a key's TTL in seconds; False if the key is missing."""
+        with self._lock:
+            entry = self._live(name)
+            if entry is None:
+                return False
+            self._store(name, entry[0], time.time() + time_)
+        return True
+
+    def pttl(self, name: str) -> int:
+        """Remaining TTL in ms; -2 if the key is missing, -1 if it never expires."""
+        with self._lock:
+            entry = self._live(name)
+        if entry is None:
+            return -2
+        if entry[1] is None:
+            return -1
+        return max(int((entry[1] - time.time()) * 1000), 0)
+
+    def incr(self, name: str, amount: int = 1) -> int:
+        with self._lock:
+            entry = self._live(name)
+            value = int(entry[0]) + amount if entry is not None else amount
+            self._store(name, str(value).encode("utf-8"), entry[1] if entry is not None else None)
+        return value
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            return sum(self._remove(_decode(name)) for name in names)
+
+    unlink = delete
+
+    def delete_if_equals(self, name: str, value: Any) -> bool:
+        """Atomically delete a key if it still holds value (lock release)."""
+        with self._lock:
+            entry = self._live(name)
+            if entry is not None and entry[0] == _to_bytes(value):
+                return self._remove(name)
+            return False
+
+    def scan(self, cursor: int = 0, match: Optional[str] = None, count: Optional[int] = None):
+        """Return all matching keys in one batch (cursor is always 0)."""
+        pattern = to_fnmatch(match) if match else None
+        with self._lock:
+            keys = [key for key in self._keys() if pattern is None or fnmatchcase(key, pattern)]
+            keys = [key for key in keys if self._live(key) is not None]
+        return 0, [key.encode("utf-8") for key in keys]
+
+    def flushdb(self) -> bool:
+        with self._lock:
+            for key in self._keys():
+                self._remove(key)
+        return True
+
+    def close(self):
+        pass
+
+
+class MemoryClient(StandInClient):
+    """
+    Dict-backed Redis stand-in for a single process.
+
+    Bounded to max_keys entries; the least recently written key is
+    evicted first, similar to Redis' allkeys-lru policy.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._data: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _load(self, key):
+        return self._data.get(key)
+
+    def _store(self, key, value, expires_at):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_keys:
+            self._data.popitem(last=False)
+
+    def _remove(self, key):
+        return self._data.pop(key, None) is not None
+
+    def _keys(self):
+        return list(self._data)
+
+
+class SQLiteClient(StandInClient):
+    """
+    SQLite-backed Redis stand-in that survives restarts and can be
+    shared by processes on the same machine.
+    """
+
+    def __init__(self, path: str = ".cache/cache.sqlite3"):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+        # Drop entries that expired while nobody was running
+        self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def _load(self, key):
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        return (bytes(row[0]), row[1]) if row else None
+
+    def _store(self, key, value, expires_at):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, expires_at)
+        )
+
+    def _remove(self, key):
+        return self._conn.execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount > 0
+
+    def _keys(self):
+        return [row[0] for row in self._conn.execute("SELECT key FROM cache")]
+
+    def set(
+        self,
+        name: str,
+        value: Any,
+        ex: Optional[float] = None,
+        px: Optional[int] = None,
+        nx: bool = False
+    ) -> Optional[bool]:
+        if not nx:
+            return super().set(name, value, ex=ex, px=px)
+        # One statement, so two processes can never both take the key:
+        # it is written if absent or expired, otherwise left alone
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+                "WHERE cache.expires_at <= ?",
+                (name, _to_bytes(value), _expires_at(ex, px), time.time())
+            )
+        return True if cursor.rowcount > 0 else None
+
+    def incr(self, name: str, amount: int = 1) -> int:
+        # BEGIN IMMEDIATE takes the write lock up front, so the
+        # read-modify-write is atomic across processes too
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = super().incr(name, amount)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return value
+
+    def expire(self, name: str, time_: float) -> bool:
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE cache SET expires_at = ? WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (now + time_, name, now)
+            ).rowcount > 0
+
+    def delete_if_equals(self, name: str, value: Any) -> bool:
+        # One statement, so another process cannot take the key between
+        # the comparison and the delete
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM cache WHERE key = ? AND value = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (name, _to_bytes(value), now)
+            ).rowcount > 0
+
+    def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        with self._lock:
+            return [entry[0] if entry else None for entry in map(self._live, keys)]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_stand_in(
+    backend: str,
+    sqlite_path: str = ".cache/cache.sqlite3",
+    max_keys: int = 100000
+) -> StandInClient:
+    """
+    Create an in-process Redis stand-in.
+
+    Args:
+        backend: "memory" or "sqlite"
+        sqlite_path: Database file for the sqlite backend
+        max_keys: Key limit for the memory backend
+
+    Returns:
+        Client exposing the redis-py methods CacheManager uses
+    """
+    if backend == "memory":
+        return MemoryClient(max_keys=max_keys)
+    if backend == "sqlite":
+        return SQLiteClient(sqlite_path)
+    raise ValueError(f"Unknown cache backend: {backend}")
@@ -1,15 +1,252 @@
 import json
+import math
+import random
+import uuid
+import numpy as np
 import redis
-from typing import Any, Optional, Callable
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, defaultdict
+from fnmatch import fnmatchcase
+from typing import Any, Dict, Iterable, List, Optional, Callable, Tuple
 from functools import wraps
 import hashlib
 import config
+from cache_backends import create_stand_in, to_fnmatch
 from logger import get_logger
+from lazy_proxy import LazyProxy
 
 logger = get_logger(__name__)
 
+
+def _key_prefix(key: str) -> str:
+    """Return the namespace part of a cache key (text before the first ':')."""
+    return key.split(":", 1)[0]
+
+
+class JSONSerializer:
+    """Default cache codec: values are stored as JSON text."""
+    
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value).encode("utf-8")
+    
+    def loads(self, payload: bytes) -> Any:
+        return json.loads(payload)
+
+
+class VectorSerializer:
+    """
+    Packed little-endian codec for embedding vectors.
+    
+    A 1536-d vector takes 6KB as float32, 3KB as float16 and ~1.5KB as
+    int8 (one float32 scale plus a byte per component) instead of ~30KB
+    of JSON. Payloads carry a short header naming their encoding, so any
+    instance decodes all of them; anything without the header is decoded
+    as legacy JSON so existing entries keep working until they expire.
+    """
+    
+    MAGIC = b"\x00VEC"
+    DTYPES = {"float32": b"4", "float16": b"2", "int8": b"1"}
+    
+    def __init__(self, dtype: str = "float32"):
+        """
+        Initialize vector serializer.
+        
+        Args:
+            dtype: Storage precision, "float32", "float16" or "int8"
+                (symmetric per-vector scale)
+        """
+        if dtype not in self.DTYPES:
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        self.dtype = dtype
+        self.header = self.MAGIC + self.DTYPES[dtype]
+    
+    def dumps(self, value: Any) -> bytes:
+        vector = np.asarray(value, dtype="<f4")
+        if self.dtype == "int8":
+            scale = float(np.abs(vector).max()) / 127.0 or 1.0
+            codes = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+            return self.header + np.float32(scale).astype("<f4").tobytes() + codes.tobytes()
+        return self.header + vector.astype("<f2" if self.dtype == "float16" else "<f4").tobytes()
+    
+    def loads(self, payload: bytes) -> np.ndarray:
+        """
+        Decode to a float32 array.
+        
+        float32 payloads are decoded zero-copy into a read-only view of
+        the payload; float16 and int8 payloads are widened to float32.
+        """
+        if not payload.startswith(self.MAGIC):
+            return np.asarray(json.loads(payload), dtype=np.float32)
+        offset = len(self.header)
+        code = payload[len(self.MAGIC):offset]
+        if code == self.DTYPES["float32"]:
+            return np.frombuffer(payload, dtype="<f4", offset=offset)
+        if code == self.DTYPES["int8"]:
+            scale = np.frombuffer(payload, dtype="<f4", count=1, offset=offset)[0]
+            return np.frombuffer(payload, dtype=np.int8, offset=offset + 4).astype(np.float32) * scale
+        return np.frombuffer(payload, dtype="<f2", offset=offset).astype(np.float32)
+
+
+class LocalCache:
+    """
+    Thread-safe, size-bounded in-process LRU cache with per-entry expiry.
+    
+    Values are stored as deserialized objects and returned by reference,
+    so callers must not mutate them.
+    """
+    
+    def __init__(self, max_items: int = 1024, max_ttl: Optional[float] = 60):
+        """
+        Initialize local cache.
+        
+        Args:
+            max_items: Maximum number of entries before LRU eviction
+            max_ttl: Upper bound on entry lifetime in seconds, which bounds
+                staleness against writes made by other processes
+        """
+        self.max_items = max_items
+        self.max_ttl = max_ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Return a live entry and mark it most recently used, or None."""
+        return self.get_with_ttl(key)[0]
+    
+    def get_with_ttl(self, key: str) -> Tuple[Optional[Any], Optional[float]]:
+        """
+        Return a live entry with the seconds left on its source TTL.
+        
+        The remaining TTL refers to the lifetime passed to set() (i.e. the
+        Redis entry), not the shorter L1 lifetime. It is None for entries
+        stored without a TTL.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > now:
+                self._data.move_to_end(key)
+                self._stats[_key_prefix(key)]["hits"] += 1
+                return entry[0], entry[2] - now if entry[2] is not None else None
+            if entry is not None:
+                del self._data[key]
+            self._stats[_key_prefix(key)]["misses"] += 1
+            return None, None
+    
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """
+        Store an entry.
+        
+        Args:
+            key: Cache key
+            value: Deserialized value
+            ttl: Remaining lifetime in seconds (L1 keeps it at most max_ttl)
+        """
+        if ttl is not None and ttl <= 0:
+            self.invalidate(key)
+            return
+        now = time.monotonic()
+        source_expires_at = now + ttl if ttl is not None else None
+        if ttl is None or (self.max_ttl is not None and ttl > self.max_ttl):
+            ttl = self.max_ttl
+        expires_at = now + ttl if ttl is not None else float("inf")
+        with self._lock:
+            self._data[key] = (value, expires_at, source_expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+    
+    def invalidate(self, key: str):
+        """Evict a single key."""
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def invalidate_pattern(self, pattern: str) -> int:
+        """Evict all keys matching a Redis-style glob pattern."""
+        pattern = to_fnmatch(pattern)
+        with self._lock:
+            keys = [key for key in self._data if fnmatchcase(key, pattern)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+    
+    def clear(self):
+        """Evict everything."""
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return hit/miss counters per key prefix."""
+        with self._lock:
+            return {prefix: dict(counts) for prefix, counts in self._stats.items()}
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# Delete the lock only if it still holds our token
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key within this process.
+    
+    The first caller for a key runs the function; callers arriving while
+    it runs wait and receive the same result (or exception).
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, dict] = {}
+    
+    def is_running(self, key: str) -> bool:
+        """Check if a call for key is in progress."""
+        with self._lock:
+            return key in self._calls
+    
+    def do(self, key: str, func: Callable[[], Any]) -> Any:
+        """Run func for key, or wait for the call already in progress."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"done": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+        
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+        
+        try:
+            call["result"] = func()
+            return call["result"]
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+
 class CacheManager:
-    """Redis cache manager for efficient data caching."""
+    """
+    Redis cache manager for efficient data caching.
+    
+    Without a Redis server it can run on an in-process stand-in ("memory"
+    or "sqlite"), either by choice or as an automatic fallback.
+    """
     
     def __init__(
         self,
@@ -17,7 +254,16 @@ class CacheManager:
         port: int = config.REDIS_PORT,
         db: int = config.REDIS_DB,
         password: Optional[str] = getattr(config, 'REDIS_PASSWORD', None),
-        default_ttl: int = 3600
+        default_ttl: int = 3600,
+        max_connections: int = getattr(config, 'REDIS_MAX_CONNECTIONS', 50),
+        health_check_interval: int = getattr(config, 'REDIS_HEALTH_CHECK_INTERVAL', 30),
+        pool_timeout: float = getattr(config, 'REDIS_POOL_TIMEOUT', 5.0),
+        connection_pool: Optional[redis.ConnectionPool] = None,
+        local_cache_size: int = getattr(config, 'CACHE_L1_MAX_ITEMS', 1024),
+        local_cache_ttl: Optional[float] = getattr(config, 'CACHE_L1_TTL', 60),
+        backend: str = getattr(config, 'CACHE_BACKEND', "redis"),
+        fallback_backend: Optional[str] = getattr(config, 'CACHE_FALLBACK', "memory"),
+        sqlite_path: str = getattr(config, 'CACHE_SQLITE_PATH', ".cache/cache.sqlite3")
     ):
         """
         Initialize Redis cache manager.
@@ -28,27 +274,87 @@ class CacheManager:
             db: Redis database number
             password: Redis password (optional)
             default_ttl: Default time-to-live in seconds (1 hour)
+            max_connections: Maximum pooled connections shared by all threads
+            health_check_interval: Seconds a pooled connection may sit idle
+                before it is re-checked with a PING on checkout
+            pool_timeout: Seconds a thread waits for a free pooled connection
+            connection_pool: Existing pool to reuse instead of creating one
+            local_cache_size: Entries kept in the in-process L1 cache (0 disables it)
+            local_cache_ttl: Maximum L1 entry lifetime in seconds
+            backend: "redis", "memory" or "sqlite"
+            fallback_backend: Stand-in to use if Redis is unreachable
+                ("memory", "sqlite" or None to disable caching instead)
+            sqlite_path: Database file for the sqlite backend
         """
         self.default_ttl = default_ttl
+        self.local = LocalCache(local_cache_size, local_cache_ttl) if local_cache_size > 0 else None
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self.default_serializer = JSONSerializer()
+        self.serializers: Dict[str, Any] = {}
+        self.backend = backend
+        self.pool = None
+        if backend != "redis":
+            self._use_stand_in(backend, sqlite_path)
+            return
         try:
-            self.client = redis.Redis(
+            # A blocking pool makes threads wait for a free connection
+            # instead of failing when all of them are checked out.
+            self.pool = connection_pool or redis.BlockingConnectionPool(
                 host=host,
                 port=port,
                 db=db,
                 password=password,
-                decode_responses=True,
-                socket_connect_timeout=5
+                socket_connect_timeout=5,
+                health_check_interval=health_check_interval,
+                max_connections=max_connections,
+                timeout=pool_timeout
             )
+            self.client = redis.Redis(connection_pool=self.pool)
             self.client.ping()
             logger.info(f"Connected to Redis at {host}:{port}")
         except redis.ConnectionError as e:
             logger.error(f"Failed to connect to Redis: {e}")
             self.client = None
+            if fallback_backend:
+                self._use_stand_in(fallback_backend, sqlite_path)
+    
+    def _use_stand_in(self, backend: str, sqlite_path: str):
+        """Switch to an in-process Redis stand-in."""
+        self.backend = backend
+        self.client = create_stand_in(
+            backend,
+            sqlite_path=sqlite_path,
+            max_keys=getattr(config, 'CACHE_MEMORY_MAX_KEYS', 100000)
+        )
+        logger.warning(f"Using in-process '{backend}' cache backend")
     
     def is_available(self) -> bool:
-        """Check if Redis is available."""
+        """Check if a cache backend is available."""
         return self.client is not None
     
+    def close(self):
+        """Disconnect all pooled connections."""
+        if self.client is None:
+            return
+        if self.backend == "redis":
+            self.pool.disconnect()
+            logger.info("Closed Redis connection pool")
+        else:
+            self.client.close()
+    
+    def register_serializer(self, prefix: str, serializer: Any):
+        """
+        Use a custom codec for all keys under a prefix.
+        
+        Args:
+            prefix: Key prefix (text before the first ':')
+            serializer: Object with dumps(value) -> bytes and loads(bytes) -> value
+        """
+        self.serializers[prefix] = serializer
+    
+    def _serializer_for(self, key: str):
+        return self.serializers.get(_key_prefix(key), self.default_serializer)
+    
     def _generate_key(self, prefix: str, *args, **kwargs) -> str:
         """Generate a cache key from arguments."""
         key_data = f"{prefix}:{str(args)}:{str(sorted(kwargs.items()))}"
@@ -58,25 +364,55 @@ class CacheManager:
         """
         Get value from cache.
         
+        Looks in the in-process L1 cache first and falls back to Redis.
+        Redis hits are copied into L1 for the key's remaining TTL.
+        
         Args:
             key: Cache key
             
         Returns:
             Cached value or None
         """
+        return self.get_with_ttl(key)[0]
+    
+    def get_with_ttl(self, key: str) -> Tuple[Optional[Any], Optional[float]]:
+        """
+        Get value from cache together with its remaining TTL.
+        
+        Args:
+            key: Cache key
+            
+        Returns:
+            (value, seconds until the Redis entry expires); (None, None) on a miss
+        """
+        if self.local is not None:
+            value, remaining = self.local.get_with_ttl(key)
+            if value is not None:
+                logger.debug(f"Cache L1 HIT: {key}")
+                return value, remaining
+        
         if not self.is_available():
-            return None
+            self._stats[_key_prefix(key)]["misses"] += 1
+            return None, None
         
         try:
-            value = self.client.get(key)
+            # Fetch the remaining TTL in the same round trip so L1
+            # never outlives the Redis entry.
+            value, pttl = self.client.pipeline(transaction=False).get(key).pttl(key).execute()
             if value:
                 logger.debug(f"Cache HIT: {key}")
-                return json.loads(value)
+                self._stats[_key_prefix(key)]["hits"] += 1
+                result = self._serializer_for(key).loads(value)
+                remaining = pttl / 1000 if pttl and pttl > 0 else None
+                if self.local is not None:
+                    self.local.set(key, result, remaining)
+                return result, remaining
             logger.debug(f"Cache MISS: {key}")
-            return None
+            self._stats[_key_prefix(key)]["misses"] += 1
+            return None, None
         except Exception as e:
             logger.error(f"Cache get error for key {key}: {e}")
-            return None
+            return None, None
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
         """
@@ -90,12 +426,15 @@ class CacheManager:
         Returns:
             True if successful, False otherwise
         """
+        ttl = ttl or self.default_ttl
+        if self.local is not None:
+            self.local.set(key, value, ttl)
+        
         if not self.is_available():
             return False
         
         try:
-            ttl = ttl or self.default_ttl
-            serialized = json.dumps(value)
+            serialized = self._serializer_for(key).dumps(value)
             self.client.setex(key, ttl, serialized)
             logger.debug(f"Cache SET: {key} (TTL: {ttl}s)")
             return True
@@ -103,8 +442,182 @@ class CacheManager:
             logger.error(f"Cache set error for key {key}: {e}")
             return False
     
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """
+        Get several values with a single Redis round trip.
+        
+        Args:
+            keys: Cache keys
+            
+        Returns:
+            Values aligned with keys (None for misses)
+        """
+        return [value for value, _ in self._get_many(keys, self.local is not None)]
+    
+    def get_many_with_ttl(self, keys: List[str]) -> List[Tuple[Optional[Any], Optional[float]]]:
+        """
+        Get several values with their remaining TTLs in a single round trip.
+        
+        Args:
+            keys: Cache keys
+            
+        Returns:
+            (value, seconds until the Redis entry expires) aligned with
+            keys; (None, None) for misses
+        """
+        return self._get_many(keys, True)
+    
+    def _get_many(self, keys: List[str], with_ttl: bool) -> List[Tuple[Optional[Any], Optional[float]]]:
+        results: List[Tuple[Optional[Any], Optional[float]]] = [(None, None)] * len(keys)
+        pending = []
+        for i, key in enumerate(keys):
+            value, remaining = self.local.get_with_ttl(key) if self.local is not None else (None, None)
+            if value is not None:
+                results[i] = (value, remaining)
+            else:
+                pending.append(i)
+        
+        if not pending:
+            return results
+        if not self.is_available():
+            for i in pending:
+                self._stats[_key_prefix(keys[i])]["misses"] += 1
+            return results
+        
+        pending_keys = [keys[i] for i in pending]
+        try:
+            if with_ttl:
+                pipe = self.client.pipeline(transaction=False)
+                pipe.mget(pending_keys)
+                for key in pending_keys:
+                    pipe.pttl(key)
+                values, *pttls = pipe.execute()
+            else:
+                values, pttls = self.client.mget(pending_keys), [None] * len(pending_keys)
+        except Exception as e:
+            logger.error(f"Cache get_many error for {len(pending_keys)} keys: {e}")
+            return results
+        
+        for i, key, value, pttl in zip(pending, pending_keys, values, pttls):
+            if not value:
+                self._stats[_key_prefix(key)]["misses"] += 1
+                continue
+            try:
+                result = self._serializer_for(key).loads(value)
+            except Exception as e:
+                logger.error(f"Cache decode error for key {key}: {e}")
+                continue
+            remaining = pttl / 1000 if pttl and pttl > 0 else None
+            results[i] = (result, remaining)
+            self._stats[_key_prefix(key)]["hits"] += 1
+            if self.local is not None:
+                self.local.set(key, result, remaining)
+        
+        hits = sum(value is not None for value, _ in results)
+        logger.debug(f"Cache MGET: {hits}/{len(keys)} hits")
+        return results
+    
+    def set_many(self, items: Iterable[tuple], ttl: Optional[int] = None) -> bool:
+        """
+        Set several values with one pipelined SETEX round trip.
+        
+        Args:
+            items: (key, value) pairs
+            ttl: Time-to-live in seconds (uses default if None)
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        ttl = ttl or self.default_ttl
+        items = list(items)
+        if not items:
+            return True
+        if self.local is not None:
+            for key, value in items:
+                self.local.set(key, value, ttl)
+        
+        if not self.is_available():
+            return False
+        
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, value in items:
+                pipe.setex(key, ttl, self._serializer_for(key).dumps(value))
+            pipe.execute()
+            logger.debug(f"Cache MSET: {len(items)} keys (TTL: {ttl}s)")
+            return True
+        except Exception as e:
+            logger.error(f"Cache set_many error for {len(items)} keys: {e}")
+            return False
+    
+    def acquire_lock(self, name: str, timeout: float) -> Optional[str]:
+        """
+        Try to take a short-lived Redis lease (SET NX PX).
+        
+        Args:
+            name: Lock key
+            timeout: Lease lifetime in seconds; it expires on its own if
+                the holder dies
+            
+        Returns:
+            Token to pass to release_lock, or None if someone else holds it.
+            Without Redis there is nobody to coordinate with, so the lease
+            is always granted.
+        """
+        token = uuid.uuid4().hex
+        if not self.is_available():
+            return token
+        try:
+            if self.client.set(name, token, nx=True, px=int(timeout * 1000)):
+                return token
+            return None
+        except Exception as e:
+            logger.error(f"Cache lock error for {name}: {e}")
+            return token
+    
+    def release_lock(self, name: str, token: str) -> bool:
+        """Release a lease taken with acquire_lock, if it is still ours."""
+        if not self.is_available():
+            return False
+        try:
+            if self.backend != "redis":
+                return self.client.delete_if_equals(name, token)
+            return bool(self.client.eval(_RELEASE_LOCK_SCRIPT, 1, name, token))
+        except Exception as e:
+            logger.error(f"Cache unlock error for {name}: {e}")
+            return False
+    
+    def expire_many(self, keys: List[str], ttl: Optional[int] = None) -> int:
+        """
+        Reset the TTL of existing keys in one pipelined EXPIRE round trip.
+        
+        Values are left untouched (nothing is re-serialized) and missing
+        keys stay missing. L1 copies keep their shorter local lifetime.
+        
+        Args:
+            keys: Cache keys
+            ttl: New time-to-live in seconds (uses default if None)
+            
+        Returns:
+            Number of keys whose TTL was reset
+        """
+        ttl = ttl or self.default_ttl
+        if not keys or not self.is_available():
+            return 0
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key in keys:
+                pipe.expire(key, ttl)
+            return sum(bool(result) for result in pipe.execute())
+        except Exception as e:
+            logger.error(f"Cache expire error for {len(keys)} keys: {e}")
+            return 0
+    
     def delete(self, key: str) -> bool:
         """Delete key from cache."""
+        if self.local is not None:
+            self.local.invalidate(key)
+        
         if not self.is_available():
             return False
         
@@ -116,32 +629,99 @@ class CacheManager:
             logger.error(f"Cache delete error for key {key}: {e}")
             return False
     
-    def clear_pattern(self, pattern: str) -> int:
+    def incr(self, key: str) -> Optional[int]:
+        """
+        Atomically increment an integer counter (INCR), bypassing L1.
+        
+        Returns:
+            The new value, or None if the backend is unavailable
+        """
+        if not self.is_available():
+            return None
+        try:
+            return int(self.client.incr(key))
+        except Exception as e:
+            logger.error(f"Cache incr error for key {key}: {e}")
+            return None
+    
+    def get_counter(self, key: str) -> Optional[int]:
+        """
+        Read a counter written by incr (0 if it was never incremented).
+        
+        Returns:
+            The value, or None if the backend is unavailable
+        """
+        if not self.is_available():
+            return None
+        try:
+            value = self.client.get(key)
+            return int(value) if value else 0
+        except Exception as e:
+            logger.error(f"Cache counter read error for key {key}: {e}")
+            return None
+    
+    def clear_pattern(
+        self,
+        pattern: str,
+        batch_size: int = 1000,
+        max_keys_per_second: Optional[float] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> int:
         """
         Clear all keys matching a pattern.
         
+        Walks the keyspace incrementally with SCAN and frees keys with
+        UNLINK, so Redis keeps serving other clients between batches.
+        
         Args:
             pattern: Redis key pattern (e.g., "embeddings:*")
+            batch_size: SCAN COUNT hint, i.e. keys examined per round trip
+            max_keys_per_second: Optional cap on the deletion rate
+            progress_callback: Called as callback(deleted, scanned) after each batch
             
         Returns:
             Number of keys deleted
         """
+        if self.local is not None:
+            self.local.invalidate_pattern(pattern)
+        
         if not self.is_available():
             return 0
         
+        deleted = 0
+        scanned = 0
+        start = time.monotonic()
         try:
-            keys = self.client.keys(pattern)
-            if keys:
-                deleted = self.client.delete(*keys)
-                logger.info(f"Cleared {deleted} keys matching pattern: {pattern}")
-                return deleted
-            return 0
+            cursor = 0
+            while True:
+                cursor, keys = self.client.scan(cursor=cursor, match=pattern, count=batch_size)
+                scanned += len(keys)
+                if keys:
+                    deleted += self.client.unlink(*keys)
+                    if max_keys_per_second:
+                        # Sleep until the average rate drops back under the cap
+                        delay = deleted / max_keys_per_second - (time.monotonic() - start)
+                        if delay > 0:
+                            time.sleep(delay)
+                if progress_callback is not None:
+                    progress_callback(deleted, scanned)
+                if cursor == 0:
+                    break
+            if deleted:
+                logger.info(
+                    f"Cleared {deleted} keys matching pattern: {pattern} "
+                    f"in {time.monotonic() - start:.2f}s"
+                )
+            return deleted
         except Exception as e:
-            logger.error(f"Cache clear pattern error for {pattern}: {e}")
-            return 0
+            logger.error(f"Cache clear pattern error for {pattern} after {deleted} keys: {e}")
+            return deleted
     
     def flush_all(self) -> bool:
         """Clear all cache data."""
+        if self.local is not None:
+            self.local.clear()
+        
         if not self.is_available():
             return False
         
@@ -152,15 +732,112 @@ class CacheManager:
         except Exception as e:
             logger.error(f"Cache flush error: {e}")
             return False
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Return hit/miss counters per key prefix.
+        
+        Returns:
+            Dict mapping prefix to l1_hits, l2_hits and misses (a miss
+            means neither tier had the key)
+        """
+        local_stats = self.local.stats() if self.local is not None else {}
+        result = {}
+        for prefix in set(local_stats) | set(self._stats):
+            l2 = self._stats.get(prefix, {"hits": 0, "misses": 0})
+            result[prefix] = {
+                "l1_hits": local_stats.get(prefix, {}).get("hits", 0),
+                "l2_hits": l2["hits"],
+                "misses": l2["misses"]
+            }
+        return result
+
+
+_cache_manager: Optional[CacheManager] = None
+_cache_manager_lock = threading.Lock()
+# Serializers for the shared manager, recorded so modules can register
+# them at import time without forcing a Redis connection
+_shared_serializers: Dict[str, Any] = {}
 
 
-def cached(prefix: str, ttl: Optional[int] = None):
+def register_shared_serializer(prefix: str, serializer: Any):
+    """
+    Register a serializer on the process-wide CacheManager.
+    
+    Applied immediately if the manager exists, otherwise when it is created.
+    """
+    with _cache_manager_lock:
+        _shared_serializers[prefix] = serializer
+        if _cache_manager is not None:
+            _cache_manager.register_serializer(prefix, serializer)
+
+
+def get_cache_manager() -> CacheManager:
+    """
+    Return the process-wide CacheManager, creating it on first use.
+    
+    All callers share one Redis connection pool, so a cached call costs
+    only its own GET/SETEX round trips.
+    """
+    global _cache_manager
+    if _cache_manager is None:
+        with _cache_manager_lock:
+            if _cache_manager is None:
+                manager = CacheManager()
+                for prefix, serializer in _shared_serializers.items():
+                    manager.register_serializer(prefix, serializer)
+                _cache_manager = manager
+    return _cache_manager
+
+
+_refresh_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_refresh_executor() -> ThreadPoolExecutor:
+    """Return the shared thread pool for background cache refreshes."""
+    global _refresh_executor
+    if _refresh_executor is None:
+        with _cache_manager_lock:
+            if _refresh_executor is None:
+                _refresh_executor = ThreadPoolExecutor(
+                    max_workers=getattr(config, 'CACHE_REFRESH_WORKERS', 4),
+                    thread_name_prefix="cache-refresh"
+                )
+    return _refresh_executor
+
+
+def cached(
+    prefix: str,
+    ttl: Optional[int] = None,
+    cache: Optional[CacheManager] = None,
+    single_flight: bool = True,
+    lock_timeout: Optional[float] = getattr(config, 'CACHE_LOCK_TIMEOUT', None),
+    early_refresh_beta: float = getattr(config, 'CACHE_EARLY_REFRESH_BETA', 0.0),
+    stale_ttl: int = 0,
+    key_builder: Optional[Callable[..., str]] = None
+):
     """
     Decorator for caching function results.
     
     Args:
         prefix: Cache key prefix
         ttl: Time-to-live in seconds
+        cache: CacheManager to use (defaults to the shared instance)
+        single_flight: Let only one thread per process recompute a missing
+            key while the others wait for its result
+        lock_timeout: If set, also take a Redis lease of this many seconds
+            so only one process recomputes a key; the others poll the cache
+            until the lease holder stores the result or the lease expires
+        early_refresh_beta: If > 0, recompute hot keys shortly before they
+            expire (XFetch). Larger values refresh earlier; 1.0 is typical.
+        stale_ttl: Stale-while-revalidate window in seconds. Entries are
+            kept for ttl + stale_ttl; once older than ttl the stale value is
+            returned immediately and refreshed on a background thread.
+            Callers only block after the whole window has passed.
+        key_builder: Function called with the wrapped function's arguments
+            that returns the key (after "prefix:"). Defaults to a hash of
+            the arguments' str(), which includes the repr of self for
+            methods and so differs between processes.
         
     Usage:
         @cached(prefix="embeddings", ttl=3600)
@@ -168,29 +845,114 @@ def cached(prefix: str, ttl: Optional[int] = None):
             return model.encode(text)
     """
     def decorator(func: Callable) -> Callable:
+        flights = SingleFlight()
+        refreshing = set()
+        refreshing_lock = threading.Lock()
+        # Moving average of recompute time, used as XFetch's delta
+        timing = {"delta": 0.0}
+        
+        def compute(manager: CacheManager, cache_key: str, args, kwargs):
+            start = time.monotonic()
+            result = func(*args, **kwargs)
+            elapsed = time.monotonic() - start
+            timing["delta"] = elapsed if not timing["delta"] else 0.8 * timing["delta"] + 0.2 * elapsed
+            manager.set(cache_key, result, (ttl or manager.default_ttl) + stale_ttl)
+            return result
+        
+        def compute_with_lease(manager: CacheManager, cache_key: str, args, kwargs):
+            lock_key = f"lock:{cache_key}"
+            deadline = time.monotonic() + lock_timeout
+            while True:
+                token = manager.acquire_lock(lock_key, lock_timeout)
+                if token is not None:
+                    try:
+                        return compute(manager, cache_key, args, kwargs)
+                    finally:
+                        manager.release_lock(lock_key, token)
+                # Another process is computing it; wait for its result
+                time.sleep(0.05)
+                result = manager.get(cache_key)
+                if result is not None:
+                    return result
+                if time.monotonic() >= deadline:
+                    logger.warning(f"Lease wait timed out for {cache_key}, computing locally")
+                    return compute(manager, cache_key, args, kwargs)
+        
+        def recompute(manager: CacheManager, cache_key: str, args, kwargs):
+            if lock_timeout:
+                return compute_with_lease(manager, cache_key, args, kwargs)
+            return compute(manager, cache_key, args, kwargs)
+        
+        def refresh_early(manager: CacheManager, cache_key: str, cached_result, args, kwargs):
+            if not lock_timeout:
+                return compute(manager, cache_key, args, kwargs)
+            # Another process is already refreshing; keep serving the cached value
+            lock_key = f"lock:{cache_key}"
+            token = manager.acquire_lock(lock_key, lock_timeout)
+            if token is None:
+                return cached_result
+            try:
+                return compute(manager, cache_key, args, kwargs)
+            finally:
+                manager.release_lock(lock_key, token)
+        
+        def refresh_in_background(manager: CacheManager, cache_key: str, cached_result, args, kwargs):
+            with refreshing_lock:
+                if cache_key in refreshing:
+                    return
+                refreshing.add(cache_key)
+            
+            def run():
+                try:
+                    flights.do(cache_key, lambda: refresh_early(manager, cache_key, cached_result, args, kwargs))
+                except Exception as e:
+                    logger.error(f"Background refresh of {func.__name__} failed: {e}")
+                finally:
+                    with refreshing_lock:
+                        refreshing.discard(cache_key)
+            
+            _get_refresh_executor().submit(run)
+        
+        def should_refresh_early(remaining: Optional[float]) -> bool:
+            if early_refresh_beta <= 0 or remaining is None or not timing["delta"]:
+                return False
+            remaining -= stale_ttl
+            # XFetch: refresh when delta * beta * -ln(U) reaches the expiry
+            return timing["delta"] * early_refresh_beta * -math.log(1.0 - random.random()) >= remaining
+        
         @wraps(func)
         def wrapper(*args, **kwargs):
-            cache = CacheManager()
+            manager = cache or get_cache_manager()
             
             # Generate cache key
-            cache_key = cache._generate_key(prefix, *args, **kwargs)
+            if key_builder is not None:
+                cache_key = f"{prefix}:{key_builder(*args, **kwargs)}"
+            else:
+                cache_key = manager._generate_key(prefix, *args, **kwargs)
             
             # Try to get from cache
-            cached_result = cache.get(cache_key)
+            cached_result, remaining = manager.get_with_ttl(cache_key)
             if cached_result is not None:
+                if stale_ttl and remaining is not None and remaining <= stale_ttl:
+                    logger.debug(f"Serving stale result for {func.__name__}, refreshing in background")
+                    refresh_in_background(manager, cache_key, cached_result, args, kwargs)
+                    return cached_result
+                if should_refresh_early(remaining) and not flights.is_running(cache_key):
+                    logger.debug(f"Refreshing {func.__name__} result early ({remaining:.1f}s left)")
+                    return flights.do(
+                        cache_key,
+                        lambda: refresh_early(manager, cache_key, cached_result, args, kwargs)
+                    )
                 logger.debug(f"Returning cached result for {func.__name__}")
                 return cached_result
             
-            # Compute result
-            result = func(*args, **kwargs)
-            
-            # Cache result
-            cache.set(cache_key, result, ttl)
-            
-            return result
+            # Compute and cache result
+            if not single_flight:
+                return recompute(manager, cache_key, args, kwargs)
+            return flights.do(cache_key, lambda: recompute(manager, cache_key, args, kwargs))
         return wrapper
     return decorator
 
 
-# Global cache instance
-cache_manager = CacheManager()
\ No newline at end of file
+# Global cache instance (connects on first use)
+cache_manager = LazyProxy(get_cache_manager, "cache_manager")
\ No newline at end of file
@@ -1,24 +1,80 @@
-from typing import List, Dict, Any
-from openai import OpenAI
+import json
+import logging
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import List, Dict, Any, Optional
 import config
 from logger import get_logger
+from services.bm25_index import BM25Index, load_bm25_index, reciprocal_rank_fusion
+from services.embedding_service import embedding_service
+from services.openai_client import get_openai_client
+from services.semantic_cache import SemanticCache
 from services.vector_db_service import vector_db_service
 from services.graph_db_service import graph_db_service
+from warmup import warmup
 
 logger = get_logger(__name__)
 
+
+def _query_logger(path: str) -> logging.Logger:
+    """JSONL logger for user queries, rotated like the application logs."""
+    query_logger = logging.getLogger(f"query_log.{Path(path).resolve()}")
+    if not query_logger.handlers:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(
+            path,
+            maxBytes=getattr(config, 'QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024),
+            backupCount=getattr(config, 'QUERY_LOG_BACKUP_COUNT', 5),
+            encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        query_logger.addHandler(handler)
+        query_logger.setLevel(logging.INFO)
+        query_logger.propagate = False
+    return query_logger
+
+
 class HybridChatService:
     """Service for hybrid RAG chat combining vector and graph databases."""
     
-    def __init__(self, chat_model: str = config.CHAT_MODEL):
+    def __init__(
+        self,
+        chat_model: str = config.CHAT_MODEL,
+        query_log_path: Optional[str] = getattr(config, 'QUERY_LOG_PATH', None),
+        semantic_cache: Optional[SemanticCache] = None,
+        use_semantic_cache: bool = getattr(config, 'SEMANTIC_CACHE_ENABLED', False),
+        sparse_index: Optional[BM25Index] = None,
+        sparse_index_path: Optional[str] = getattr(config, 'BM25_INDEX_PATH', ".cache/bm25"),
+        rrf_k: int = getattr(config, 'RRF_K', 60)
+    ):
         """
         Initialize hybrid chat service.
         
         Args:
             chat_model: OpenAI chat model to use
+            query_log_path: JSONL file receiving every user query, mined by
+                warm_query_cache.py and rotated at QUERY_LOG_MAX_BYTES
+                (None, the default, disables logging: queries may hold
+                personal data)
+            semantic_cache: Cache answering near-duplicate queries
+                (defaults to a new SemanticCache)
+            use_semantic_cache: Whether to use a semantic cache at all (off
+                by default: a hit returns another query's answer)
+            sparse_index: BM25 index fused with vector search (loaded from
+                sparse_index_path if not given; vector search only if absent)
+            sparse_index_path: Directory written by build_bm25_index.py
+                (None disables sparse retrieval)
+            rrf_k: Reciprocal rank fusion constant
         """
         self.chat_model = chat_model
-        self.client = OpenAI(api_key=config.OPENAI_API_KEY)
+        self.query_log_path = query_log_path
+        self._query_log = _query_logger(query_log_path) if query_log_path else None
+        self.client = get_openai_client()
+        self.semantic_cache = (semantic_cache or SemanticCache()) if use_semantic_cache else None
+        self._semantic_generation = None
+        self.sparse_index = sparse_index or load_bm25_index(sparse_index_path)
+        self.rrf_k = rrf_k
         logger.info(f"Initialized HybridChatService with model: {chat_model}")
     
     def retrieve_context(
@@ -40,13 +96,18 @@ class HybridChatService:
         """
         logger.info(f"Retrieving context for query: {query[:50]}...")
         
-        # 1. Vector search
+        # 1. Vector search, fused with BM25 when a sparse index is available
         logger.debug("Performing vector search")
+        candidates = top_k * 2 if self.sparse_index is not None else top_k
         vector_matches = vector_db_service.search(
             query_text=query,
-            top_k=top_k,
+            top_k=candidates,
             include_metadata=True
         )
+        if self.sparse_index is not None:
+            sparse_matches = self.sparse_index.search(query, top_k=candidates)
+            vector_matches = reciprocal_rank_fusion([vector_matches, sparse_matches], top_k, k=self.rrf_k)
+            logger.info(f"Fused vector and {len(sparse_matches)} BM25 matches")
         logger.info(f"Retrieved {len(vector_matches)} vector matches")
         
         # 2. Extract node IDs from matches
@@ -96,13 +157,15 @@ class HybridChatService:
         vec_context = []
         for match in vector_matches:
             meta = match["metadata"]
-            score = match.get("score", 0.0)
+            score = match.get("score")
             snippet = (
                 f"- ID: {match['id']}, "
                 f"Name: {meta.get('name', 'N/A')}, "
-                f"Type: {meta.get('type', 'N/A')}, "
-                f"Score: {score:.3f}"
+                f"Type: {meta.get('type', 'N/A')}"
             )
+            # Fused matches found only by BM25 have no similarity score
+            if score is not None:
+                snippet += f", Score: {score:.3f}"
             if meta.get("city"):
                 snippet += f", City: {meta.get('city')}"
             vec_context.append(snippet)
@@ -154,7 +217,7 @@ class HybridChatService:
         """
         try:
             logger.debug("Generating chat response")
-            response = self.client.chat.completions.create(
+            response = self.client.create_chat_completion(
                 model=self.chat_model,
                 messages=messages,
                 max_tokens=max_tokens,
@@ -168,6 +231,11 @@ class HybridChatService:
             logger.error(f"Error generating response: {e}")
             raise
     
+    def _log_query(self, query: str):
+        """Append a query to the query log."""
+        if self._query_log is not None:
+            self._query_log.info(json.dumps({"ts": time.time(), "query": query}, ensure_ascii=False))
+    
     def chat(self, query: str, top_k: int = config.TOP_K) -> Dict[str, Any]:
         """
         Complete chat flow: retrieve context, build prompt, generate response.
@@ -179,9 +247,32 @@ class HybridChatService:
         Returns:
             Dictionary with query, answer, and context
         """
+        self._log_query(query)
         try:
+            context = None
+            query_vector = None
+            hit = None
+            scope = None
+            if self.semantic_cache is not None:
+                scope = self._semantic_scope(top_k)
+                query_vector = embedding_service.embed_single(query)
+                hit = self.semantic_cache.lookup(query_vector, scope=scope)
+            
+            if hit is not None:
+                if not self.semantic_cache.should_sample():
+                    return self._from_semantic_cache(query, hit)
+                # Verify a sample of hits against a fresh retrieval
+                context = self.retrieve_context(query, top_k=top_k)
+                agreement = _match_overlap(hit["result"]["vector_matches"], context["vector_matches"])
+                false_hit = agreement < getattr(config, 'SEMANTIC_CACHE_MIN_AGREEMENT', 0.5)
+                self.semantic_cache.record_sample(query, hit, false_hit, agreement)
+                if not false_hit:
+                    return self._from_semantic_cache(query, hit)
+                self.semantic_cache.invalidate(hit)
+            
             # Retrieve context
-            context = self.retrieve_context(query, top_k=top_k)
+            if context is None:
+                context = self.retrieve_context(query, top_k=top_k)
             
             # Build prompt
             messages = self.build_prompt(
@@ -193,12 +284,15 @@ class HybridChatService:
             # Generate response
             answer = self.generate_response(messages)
             
-            return {
+            result = {
                 "query": query,
                 "answer": answer,
                 "vector_matches": context["vector_matches"],
                 "graph_facts": context["graph_facts"]
             }
+            if query_vector is not None:
+                self.semantic_cache.store(query, query_vector, result, scope=scope)
+            return result
         except Exception as e:
             logger.error(f"Error in chat: {e}")
             return {
@@ -207,12 +301,52 @@ class HybridChatService:
                 "vector_matches": [],
                 "graph_facts": []
             }
+    
+    def _semantic_scope(self, top_k: int) -> tuple:
+        """
+        Semantic cache scope: answers only match the same top_k, chat model
+        and index contents. Entries are dropped once the index changes.
+        """
+        generation = (vector_db_service.index_version, vector_db_service.search_generation())
+        if generation != self._semantic_generation:
+            if self._semantic_generation is not None:
+                logger.info("Vector index changed, clearing the semantic cache")
+                self.semantic_cache.clear()
+            self._semantic_generation = generation
+        return (top_k, self.chat_model, *generation)
+    
+    def _from_semantic_cache(self, query: str, hit: Dict[str, Any]) -> Dict[str, Any]:
+        """Build a chat result from a semantic cache hit."""
+        logger.info(
+            f"Semantic cache hit for query: {query[:50]} "
+            f"(matched '{hit['query'][:50]}', similarity {hit['similarity']:.3f})"
+        )
+        return {
+            **hit["result"],
+            "query": query,
+            "semantic_cache": {"matched_query": hit["query"], "similarity": hit["similarity"]}
+        }
+
+
+def _match_overlap(cached: List[Dict[str, Any]], fresh: List[Dict[str, Any]]) -> float:
+    """Jaccard overlap of the node IDs in two vector match lists."""
+    cached_ids = {match["id"] for match in cached}
+    fresh_ids = {match["id"] for match in fresh}
+    if not cached_ids and not fresh_ids:
+        return 1.0
+    return len(cached_ids & fresh_ids) / len(cached_ids | fresh_ids)
 
 
 def interactive_chat():
     """Run interactive chat session."""
+    # Connect everything up front so the first question is not the slow one
+    report = warmup()
+    for name, result in report.items():
+        if not result["ok"]:
+            print(f"⚠️  {name} unavailable: {result['error']}")
+
     chat_service = HybridChatService()
-    
+
     print("\n" + "="*60)
     print("Hybrid Travel Assistant (Vietnam)")
     print("Type 'exit' or 'quit' to end the session")
@@ -0,0 +1,91 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class LazyProxy:
+    """
+    Stand-in for a module-level service instance that is built on first use.
+
+    Attribute access is forwarded to the real instance, which is created
+    exactly once (thread-safe) the first time any attribute is touched.
+    Importing a module that defines a LazyProxy therefore costs nothing.
+    """
+
+    def __init__(self, factory: Callable[[], Any], name: Optional[str] = None):
+        """
+        Initialize proxy.
+
+        Args:
+            factory: Zero-argument callable creating the instance
+            name: Name used in logs (defaults to the factory's name)
+        """
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_name", name or getattr(factory, "__name__", repr(factory)))
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(resolve(self), attr)
+
+    def __setattr__(self, attr: str, value: Any):
+        setattr(resolve(self), attr, value)
+
+    def __repr__(self) -> str:
+        state = "initialized" if is_initialized(self) else "not initialized"
+        return f"<LazyProxy {self._name} ({state})>"
+
+
+def resolve(proxy: Any) -> Any:
+    """Return the real instance behind a proxy, creating it if needed."""
+    if not isinstance(proxy, LazyProxy):
+        return proxy
+    instance = object.__getattribute__(proxy, "_instance")
+    if instance is None:
+        with object.__getattribute__(proxy, "_lock"):
+            instance = object.__getattribute__(proxy, "_instance")
+            if instance is None:
+                name = object.__getattribute__(proxy, "_name")
+                start = time.perf_counter()
+                instance = object.__getattribute__(proxy, "_factory")()
+                object.__setattr__(proxy, "_instance", instance)
+                logger.debug(f"Initialized {name} in {time.perf_counter() - start:.3f}s")
+    return instance
+
+
+def is_initialized(proxy: Any) -> bool:
+    """Check whether a proxy's instance has been created."""
+    if not isinstance(proxy, LazyProxy):
+        return True
+    return object.__getattribute__(proxy, "_instance") is not None
+
+
+def initialize_all(proxies: Dict[str, Any], max_workers: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Initialize several proxies concurrently.
+
+    Args:
+        proxies: Mapping of display name to proxy
+        max_workers: Thread count (defaults to one per proxy)
+
+    Returns:
+        Per-name dict with "ok", "seconds" and, on failure, "error"
+    """
+    def init(item):
+        name, proxy = item
+        start = time.perf_counter()
+        try:
+            resolve(proxy)
+            return name, {"ok": True, "seconds": time.perf_counter() - start}
+        except Exception as e:
+            logger.error(f"Failed to initialize {name}: {e}")
+            return name, {"ok": False, "seconds": time.perf_counter() - start, "error": str(e)}
+
+    if not proxies:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(proxies)) as executor:
+        return dict(executor.map(init, proxies.items()))
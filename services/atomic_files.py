@@ -0,0 +1,22 @@
+import os
+from pathlib import Path
+from typing import IO, Callable, Union
+
+
+def replace_file(path: Union[str, Path], write: Callable[[IO], None], mode: str = "wb"):
+    """
+    Atomically replace a file with whatever write() puts in it.
+
+    write() fills a temporary file next to path, which is then renamed
+    over it, so readers see either the old or the new contents.
+
+    Args:
+        path: File to replace
+        write: Function writing the new contents to an open file
+        mode: "wb" for bytes or "w" for UTF-8 text
+    """
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.tmp")
+    with open(tmp, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+        write(f)
+    os.replace(tmp, path)
@@ -3,6 +3,7 @@ from typing import Optional, Any
 from azure.storage.blob import BlobServiceClient
 from azure.core.exceptions import ResourceNotFoundError
 import config
+from lazy_proxy import LazyProxy
 
 class AzureBlob:
     """Minimal Azure Blob helper for uploading/downloading files."""
@@ -64,5 +65,5 @@ class AzureBlob:
         except ResourceNotFoundError:
             return False
 
-# Global instance
-azure_blob = AzureBlob()
+# Global instance (connects on first use)
+azure_blob = LazyProxy(AzureBlob, "azure_blob")
@@ -0,0 +1,255 @@
+import json
+import re
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from logger import get_logger
+from services.atomic_files import replace_file
+
+logger = get_logger(__name__)
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# Node fields indexed for sparse retrieval
+TEXT_FIELDS = ("name", "description", "city")
+# Node fields returned as match metadata, like the Pinecone metadata
+METADATA_FIELDS = ("name", "type", "city")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into casefolded, diacritic-free tokens.
+
+    "Hội An" and "Hoi An" produce the same tokens. Identifiers such as
+    "attraction_hoi_an" are kept whole and also split on underscores.
+    """
+    folded = unicodedata.normalize("NFKD", text.casefold().replace("đ", "d"))
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    tokens = []
+    for token in _TOKEN.findall(folded):
+        tokens.append(token)
+        if "_" in token:
+            tokens.extend(part for part in token.split("_") if part)
+    return tokens
+
+
+def node_text(node: Dict[str, Any]) -> str:
+    """Text indexed for a node: its name, description and city."""
+    return " ".join(str(node[field]) for field in TEXT_FIELDS if node.get(field))
+
+
+class BM25Index:
+    """
+    Okapi BM25 index over graph nodes with array-backed postings.
+
+    Postings are stored CSR-style: for term t, doc_ids[offsets[t]:offsets[t+1]]
+    lists the documents containing it and weights holds the precomputed
+    BM25 contribution of t to each of them. A query is then one slice-add
+    per query term followed by a top-k partition.
+
+    Layout of the index directory:
+        meta.json     - k1, b
+        terms.json    - vocabulary in term-id order
+        docs.jsonl    - {"id", "metadata"} per document
+        *.npy         - offsets, doc_ids, tfs, doc_len and weights,
+                        memory-mapped on load
+    """
+
+    ARRAYS = ("offsets", "doc_ids", "tfs", "doc_len", "weights")
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.terms: Dict[str, int] = {}
+        self.ids: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.uint16)
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.weights = np.zeros(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_nodes(cls, nodes: Iterable[Dict[str, Any]], **kwargs) -> "BM25Index":
+        """Build an index from graph node dicts (id, name, description, city, ...)."""
+        index = cls(**kwargs)
+        index.add_many(
+            (node["id"], node_text(node), {field: node[field] for field in METADATA_FIELDS if node.get(field)})
+            for node in nodes
+        )
+        return index
+
+    def _triples(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Existing postings as parallel (term, doc, tf) arrays."""
+        terms = np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int64), np.diff(self.offsets))
+        return terms, np.asarray(self.doc_ids, dtype=np.int64), np.asarray(self.tfs, dtype=np.int64)
+
+    def add_many(self, docs: Iterable[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """
+        Add or replace documents and rebuild the postings.
+
+        Args:
+            docs: (id, text, metadata) tuples
+
+        Returns:
+            Number of documents added or replaced
+        """
+        rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        ids, metadata = list(self.ids), list(self.metadata)
+        doc_len = list(np.asarray(self.doc_len))
+        replaced = set()
+        new_terms, new_docs, new_tfs = [], [], []
+        count = 0
+        for doc_id, text, meta in docs:
+            row = rows.get(doc_id)
+            if row is None:
+                row = rows[doc_id] = len(ids)
+                ids.append(doc_id)
+                metadata.append(meta)
+                doc_len.append(0.0)
+            else:
+                replaced.add(row)
+                metadata[row] = meta
+            tokens = tokenize(text)
+            doc_len[row] = float(len(tokens))
+            for term, tf in Counter(tokens).items():
+                new_terms.append(self.terms.setdefault(term, len(self.terms)))
+                new_docs.append(row)
+                new_tfs.append(tf)
+            count += 1
+        if not count:
+            return 0
+
+        terms, doc_ids, tfs = self._triples()
+        if replaced:
+            keep = ~np.isin(doc_ids, np.fromiter(replaced, dtype=np.int64))
+            terms, doc_ids, tfs = terms[keep], doc_ids[keep], tfs[keep]
+        terms = np.concatenate([terms, np.asarray(new_terms, dtype=np.int64)])
+        doc_ids = np.concatenate([doc_ids, np.asarray(new_docs, dtype=np.int64)])
+        tfs = np.concatenate([tfs, np.asarray(new_tfs, dtype=np.int64)])
+
+        order = np.lexsort((doc_ids, terms))
+        terms = terms[order]
+        self.ids, self.metadata = ids, metadata
+        self.doc_ids = doc_ids[order].astype(np.int32)
+        self.tfs = np.minimum(tfs[order], np.iinfo(np.uint16).max).astype(np.uint16)
+        self.offsets = np.searchsorted(terms, np.arange(len(self.terms) + 1)).astype(np.int64)
+        self.doc_len = np.asarray(doc_len, dtype=np.float32)
+        self._compute_weights()
+        return count
+
+    def _compute_weights(self):
+        """Precompute each posting's BM25 term-document score."""
+        n = len(self.ids)
+        df = np.diff(self.offsets).astype(np.float32)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        avg_len = float(self.doc_len.mean()) if n else 0.0
+        terms = np.repeat(np.arange(len(df)), np.diff(self.offsets))
+        tf = self.tfs.astype(np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len[self.doc_ids] / max(avg_len, 1e-9))
+        self.weights = (idf[terms] * tf * (self.k1 + 1) / (tf + norm)).astype(np.float32)
+
+    def search(self, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
+        """
+        Score documents against a query.
+
+        Returns:
+            Matches with id, score (BM25) and metadata, best first
+        """
+        term_ids = {self.terms[token] for token in tokenize(query) if token in self.terms}
+        if not term_ids or top_k <= 0:
+            return []
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in term_ids:
+            start, end = self.offsets[term], self.offsets[term + 1]
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+        candidates = np.flatnonzero(scores)
+        k = min(top_k, len(candidates))
+        best = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        best = best[np.argsort(-scores[best])]
+        return [
+            {"id": self.ids[row], "score": float(scores[row]), "metadata": self.metadata[row]}
+            for row in best.tolist()
+        ]
+
+    def save(self, path: str):
+        """Write the index to a directory (each file is replaced atomically)."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in self.ARRAYS:
+            replace_file(path / f"{name}.npy", lambda f: np.save(f, np.asarray(getattr(self, name))))
+        replace_file(path / "terms.json", lambda f: json.dump(
+            sorted(self.terms, key=self.terms.get), f, ensure_ascii=False
+        ), mode="w")
+        replace_file(path / "docs.jsonl", lambda f: f.writelines(
+            json.dumps({"id": doc_id, "metadata": meta}, ensure_ascii=False) + "\n"
+            for doc_id, meta in zip(self.ids, self.metadata)
+        ), mode="w")
+        replace_file(path / "meta.json", lambda f: json.dump({"k1": self.k1, "b": self.b}, f), mode="w")
+        logger.info(f"Saved BM25 index at {path} ({len(self)} documents, {len(self.terms)} terms)")
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        path = Path(path)
+        meta = json.loads((path / "meta.json").read_text())
+        index = cls(k1=meta["k1"], b=meta["b"])
+        index.terms = {term: i for i, term in enumerate(json.loads((path / "terms.json").read_text(encoding="utf-8")))}
+        with open(path / "docs.jsonl", encoding="utf-8") as f:
+            docs = [json.loads(line) for line in f if line.strip()]
+        index.ids = [doc["id"] for doc in docs]
+        index.metadata = [doc.get("metadata") or {} for doc in docs]
+        for name in cls.ARRAYS:
+            setattr(index, name, np.load(path / f"{name}.npy", mmap_mode="r"))
+        logger.info(f"Loaded BM25 index from {path} ({len(index)} documents)")
+        return index
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[Dict[str, Any]]],
+    top_k: int,
+    k: int = 60
+) -> List[Dict[str, Any]]:
+    """
+    Merge ranked match lists with reciprocal rank fusion.
+
+    Each document scores sum(1 / (k + rank)) over the lists it appears
+    in; its metadata comes from the first list that has any. Put the list
+    whose scores callers show first: its original score (e.g. cosine
+    similarity) is kept as "score".
+
+    Returns:
+        Matches with id, score (from the first list, None if absent
+        there), fused_score, metadata and per-list "ranks" (1-based) and
+        "scores" (None where absent), best fused first
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for position, ranking in enumerate(rankings):
+        for rank, match in enumerate(ranking, start=1):
+            entry = fused.setdefault(match["id"], {
+                "id": match["id"],
+                "score": None,
+                "fused_score": 0.0,
+                "metadata": match.get("metadata") or {},
+                "ranks": [None] * len(rankings),
+                "scores": [None] * len(rankings),
+            })
+            if not entry["metadata"] and match.get("metadata"):
+                entry["metadata"] = match["metadata"]
+            entry["fused_score"] += 1.0 / (k + rank)
+            entry["ranks"][position] = rank
+            entry["scores"][position] = match.get("score")
+            if position == 0:
+                entry["score"] = match.get("score")
+    return sorted(fused.values(), key=lambda entry: -entry["fused_score"])[:top_k]
+
+
+def load_bm25_index(path: Optional[str]) -> Optional[BM25Index]:
+    """Load the index at path, or return None if it has not been built."""
+    if not path or not (Path(path) / "meta.json").exists():
+        return None
+    return BM25Index.load(path)
@@ -0,0 +1,137 @@
+import hashlib
+import re
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+import config
+from logger import get_logger
+from services.openai_client import get_openai_client
+
+logger = get_logger(__name__)
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class OpenAIEmbeddingBackend:
+    """Embeddings from the OpenAI API through the shared rate-limited client."""
+
+    # Requests are I/O bound, so chunks may run concurrently
+    max_concurrency: Optional[int] = None
+
+    def __init__(self, model: str):
+        self.model = model
+        self.client = get_openai_client()
+
+    def embed(self, texts: List[str], tokens: Optional[int] = None) -> List[np.ndarray]:
+        response = self.client.create_embeddings(self.model, texts, tokens=tokens)
+        return [np.asarray(data.embedding, dtype=np.float32) for data in response.data]
+
+
+class LocalEmbeddingBackend:
+    """
+    Embeddings from a local sentence-transformers model on CPU.
+
+    The model is loaded once per process; batches are encoded in a single
+    call, so the service should not run chunks concurrently.
+    """
+
+    max_concurrency: Optional[int] = 1
+
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: int = getattr(config, 'LOCAL_EMBED_BATCH_SIZE', 32),
+        num_threads: Optional[int] = getattr(config, 'LOCAL_EMBED_NUM_THREADS', None),
+        device: str = getattr(config, 'LOCAL_EMBED_DEVICE', "cpu")
+    ):
+        """
+        Load a local embedding model.
+
+        Args:
+            model_name: sentence-transformers model name or path
+            batch_size: Texts per forward pass
+            num_threads: Intra-op CPU threads for torch (None keeps its default)
+            device: Torch device
+        """
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "Local embedding models need the sentence-transformers package"
+            ) from e
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device=device)
+        self._lock = threading.Lock()
+        logger.info(f"Loaded local embedding model {model_name} on {device}")
+
+    def embed(self, texts: List[str], tokens: Optional[int] = None) -> List[np.ndarray]:
+        with self._lock:
+            matrix = self.model.encode(
+                texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+        return list(np.asarray(matrix, dtype=np.float32))
+
+
+class HashEmbeddingBackend:
+    """
+    Deterministic feature-hashing embeddings for tests and benchmarks.
+
+    Words and word bigrams are hashed into signed buckets and the result is
+    L2-normalized, so texts sharing words get similar vectors. Needs no
+    network or model files and is stable across processes.
+    """
+
+    max_concurrency: Optional[int] = 1
+
+    def __init__(self, dim: int = 1536):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        words = _TOKEN.findall(text.casefold())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text) or [text]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed(self, texts: List[str], tokens: Optional[int] = None) -> List[np.ndarray]:
+        return [self.embed_one(text) for text in texts]
+
+
+_backends: Dict[str, object] = {}
+_backends_lock = threading.Lock()
+
+
+def get_embedding_backend(model: str):
+    """
+    Return the (process-wide) backend for a model name.
+
+    Model names select the backend:
+        "local:<name>"  - sentence-transformers model <name>
+        "hash" or "hash:<dim>" - deterministic hashing embeddings
+        anything else   - OpenAI embeddings model
+    """
+    with _backends_lock:
+        if model not in _backends:
+            if model.startswith("local:"):
+                _backends[model] = LocalEmbeddingBackend(model[len("local:"):])
+            elif model == "hash" or model.startswith("hash:"):
+                dim = int(model.split(":", 1)[1]) if ":" in model else getattr(config, 'PINECONE_VECTOR_DIM', 1536)
+                _backends[model] = HashEmbeddingBackend(dim)
+            else:
+                _backends[model] = OpenAIEmbeddingBackend(model)
+        return _backends[model]
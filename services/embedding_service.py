@@ -1,120 +1,529 @@
-from typing import List, Union
-from openai import OpenAI
+import hashlib
+import queue
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
 import config
 from logger import get_logger
-from cache_manager import cached, cache_manager
+from lazy_proxy import LazyProxy
+from cache_manager import cache_manager, register_shared_serializer, VectorSerializer
+from services.embedding_store import EmbeddingStore
+from services.embedding_backends import get_embedding_backend
+from services.quantization import truncate_matryoshka
+
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to a length heuristic
+    tiktoken = None
 
 logger = get_logger(__name__)
 
+# Embeddings are cached as packed floats instead of JSON lists
+EMBEDDING_CACHE_DTYPE = getattr(config, 'EMBEDDING_CACHE_DTYPE', "float32")
+register_shared_serializer("embedding", VectorSerializer(EMBEDDING_CACHE_DTYPE))
+
+# Bump when the key derivation changes so old and new entries never collide
+CACHE_KEY_VERSION = "v2"
+
+NORMALIZATION_MODES = ("none", "whitespace", "casefold")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str, mode: str = "whitespace") -> str:
+    """
+    Normalize text before embedding so trivial variants share one vector.
+    
+    Args:
+        text: Input text
+        mode: "none" (Unicode NFC only), "whitespace" (also trim and
+            collapse runs of whitespace) or "casefold" (also casefold)
+        
+    Returns:
+        Normalized text
+    """
+    text = unicodedata.normalize("NFC", text)
+    if mode == "none":
+        return text
+    text = _WHITESPACE.sub(" ", text).strip()
+    if mode == "casefold":
+        text = text.casefold()
+    return text
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-text embedding requests into batches.
+    
+    Callers submit one text and get a Future. A background thread waits
+    up to max_wait_ms after the first pending text (or until max_items are
+    queued) and hands the group to a pool of max_concurrency workers, each
+    embedding its group with one batch call and resolving each caller's
+    Future with its own vector. The thread keeps collecting the next group
+    while earlier ones are in flight.
+    """
+    
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], List[np.ndarray]],
+        max_wait_ms: float = 5,
+        max_items: int = 64,
+        max_concurrency: int = 4
+    ):
+        """
+        Initialize micro-batcher.
+        
+        Args:
+            embed_batch: Function embedding a list of texts in order
+            max_wait_ms: Longest time a text waits for others to join its batch
+            max_items: Flush as soon as this many texts are queued
+            max_concurrency: Batches being embedded at once
+        """
+        self.embed_batch = embed_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_items = max_items
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="embedding-micro-batch"
+        )
+    
+    def submit(self, text: str) -> Future:
+        """Queue a text and return a Future for its embedding."""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="embedding-micro-batcher", daemon=True
+                    )
+                    self._thread.start()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+    
+    def _run(self):
+        batch: List[tuple] = []
+        try:
+            while True:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.max_wait
+                while len(batch) < self.max_items:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                # Wait for a free worker; texts arriving meanwhile join this batch
+                self._slots.acquire()
+                while len(batch) < self.max_items:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    self._executor.submit(self._flush, batch)
+                except BaseException:
+                    self._slots.release()
+                    raise
+                batch = []
+        except BaseException as e:
+            logger.error(f"Micro-batcher thread stopped: {e!r}")
+            with self._lock:
+                self._thread = None
+            # Nobody will flush these any more
+            self._fail(batch, e)
+            while True:
+                try:
+                    self._fail([self._queue.get_nowait()], e)
+                except queue.Empty:
+                    break
+            raise
+    
+    @staticmethod
+    def _fail(batch: List[tuple], error: BaseException):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+    
+    def _flush(self, batch: List[tuple]):
+        texts = [text for text, _ in batch]
+        logger.debug(f"Micro-batch of {len(texts)} texts")
+        try:
+            embeddings = self.embed_batch(texts)
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+        except BaseException as e:
+            self._fail(batch, e)
+        finally:
+            self._slots.release()
+
+
 class EmbeddingService:
     """Service for generating text embeddings with caching."""
 
-    def __init__(self, model: str = config.EMBED_MODEL):
+    def __init__(
+        self,
+        model: str = config.EMBED_MODEL,
+        store_dir: Optional[str] = getattr(config, 'EMBEDDING_STORE_DIR', ".cache/embeddings"),
+        max_batch_size: int = getattr(config, 'EMBED_MAX_BATCH_SIZE', 512),
+        max_batch_tokens: int = getattr(config, 'EMBED_MAX_BATCH_TOKENS', 200000),
+        max_concurrency: int = getattr(config, 'EMBED_MAX_CONCURRENCY', 4),
+        micro_batch_ms: float = getattr(config, 'EMBED_MICRO_BATCH_MS', 0),
+        micro_batch_size: int = getattr(config, 'EMBED_MICRO_BATCH_SIZE', 64),
+        normalization: str = getattr(config, 'EMBED_TEXT_NORMALIZATION', "whitespace"),
+        output_dim: Optional[int] = getattr(config, 'EMBED_OUTPUT_DIM', None)
+    ):
         """
         Initialize embedding service.
         
         Args:
-            model: OpenAI embedding model name
+            model: Embedding model name; "local:<name>" and "hash[:<dim>]"
+                select the local and hashing backends, anything else is
+                an OpenAI model
+            store_dir: Directory for the on-disk EmbeddingStore (None disables it)
+            max_batch_size: Maximum texts per embeddings API request
+            max_batch_tokens: Maximum total tokens per embeddings API request
+            max_concurrency: Maximum embeddings API requests in flight
+            micro_batch_ms: If > 0, concurrent embed_single calls arriving
+                within this many milliseconds share one batched request
+            micro_batch_size: Maximum texts per micro-batch
+            normalization: Text normalization applied before embedding
+                ("none", "whitespace" or "casefold")
+            output_dim: If set, returned vectors are Matryoshka-truncated to
+                this many dimensions and renormalized. The cache and store
+                keep full vectors, so this can be changed without re-embedding.
         """
+        if normalization not in NORMALIZATION_MODES:
+            raise ValueError(f"Unknown normalization mode: {normalization}")
         self.model = model
-        self.client = OpenAI(api_key=config.OPENAI_API_KEY)
+        self.normalization = normalization
+        self.output_dim = output_dim
+        self._stats = {"texts": 0, "unique": 0, "store_hits": 0, "cache_hits": 0, "computed": 0}
+        self._stats_lock = threading.Lock()
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.backend = get_embedding_backend(model)
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+        self._batcher = None
+        if micro_batch_ms > 0:
+            self._batcher = MicroBatcher(
+                lambda texts: self.embed_batch(texts, persist=False),
+                max_wait_ms=micro_batch_ms,
+                max_items=micro_batch_size,
+                max_concurrency=max_concurrency
+            )
+        self.store = EmbeddingStore(Path(store_dir) / model.replace("/", "_")) if store_dir else None
         logger.info(f"Initialized EmbeddingService with model: {model}")
 
-    def _generate_cache_key(self, text: Union[str, List[str]]) -> str:
-        """Generate cache key for embeddings."""
-        if isinstance(text, list):
-            text = "|".join(text[:3])  
-        return f"embedding:{self.model}:{hash(text)}"
+    def _content_hash(self, text: str) -> str:
+        """
+        Return a deterministic digest of the model name and NFC-normalized
+        text, so every worker and restart derives the same value.
+        """
+        normalized = unicodedata.normalize("NFC", text)
+        return hashlib.blake2b(
+            f"{self.model}\0{normalized}".encode("utf-8"),
+            digest_size=16
+        ).hexdigest()
+    
+    def _generate_cache_key(self, text: str) -> str:
+        """Generate a deterministic cache key for a text's embedding."""
+        return f"embedding:{self.model}:{CACHE_KEY_VERSION}:{self._content_hash(text)}"
+    
+    def _count_tokens(self, text: str) -> int:
+        """Count tokens with tiktoken, or estimate ~4 characters per token."""
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(text) // 4 + 1
+    
+    def _chunk_by_tokens(self, texts: List[str]) -> List[Tuple[List[int], int]]:
+        """
+        Split text indices into chunks within the per-request count and token limits.
         
-    @cached(prefix="embedding", ttl=config.CACHE_TTL_EMBEDDINGS)
-    def embed_single(self, text: str) -> List[float]:
+        Returns:
+            (indices, token count) for each chunk
+        """
+        chunks = []
+        current, current_tokens = [], 0
+        for i, text in enumerate(texts):
+            tokens = self._count_tokens(text)
+            if current and (
+                len(current) >= self.max_batch_size
+                or current_tokens + tokens > self.max_batch_tokens
+            ):
+                chunks.append((current, current_tokens))
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            chunks.append((current, current_tokens))
+        return chunks
+    
+    def _request_embeddings(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Embed texts through the backend in token-budgeted chunks.
+        
+        Chunks run concurrently on up to max_concurrency threads (fewer if
+        the backend caps it) and the results are returned in input order.
+        """
+        chunks = self._chunk_by_tokens(texts)
+        
+        def request(chunk: Tuple[List[int], int]) -> List[np.ndarray]:
+            indices, tokens = chunk
+            return self.backend.embed([texts[i] for i in indices], tokens=tokens)
+        
+        if len(chunks) == 1:
+            return request(chunks[0])
+        
+        logger.info(f"Embedding {len(texts)} texts in {len(chunks)} requests")
+        embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+        workers = min(self.max_concurrency, self.backend.max_concurrency or self.max_concurrency, len(chunks))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for (indices, _), vectors in zip(chunks, executor.map(request, chunks)):
+                for i, vector in zip(indices, vectors):
+                    embeddings[i] = vector
+        return embeddings
+    
+    def embed_single(self, text: str) -> np.ndarray:
         """
         Generate embedding for a single text.
         
+        Shares cache keys with embed_batch. With micro-batching enabled,
+        concurrent calls are grouped into one batched request.
+        
         Args:
             text: Input text
             
         Returns:
             Embedding vector
         """
-        try:
-            logger.debug(f"Generating embedding for text: {text[:50]}...")
-            response = self.client.embeddings.create(
-                model=self.model,
-                input=[text]
-            )
-            embedding = response.data[0].embedding
-            logger.debug(f"Generated embedding with dimension: {len(embedding)}")
-            return embedding
-        except Exception as e:
-            logger.error(f"Error generating embedding: {e}")
-            raise  
+        logger.debug(f"Generating embedding for text: {text[:50]}...")
+        if self._batcher is not None:
+            return self._batcher.submit(text).result()
+        # One-off query texts are not worth a permanent slot in the store
+        return self.embed_batch([text], persist=False)[0]
     
-    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+    def embed_batch(
+        self,
+        texts: List[str],
+        ids: Optional[List[str]] = None,
+        persist: bool = True
+    ) -> List[np.ndarray]:
         """
         Generate embeddings for multiple texts with caching.
         
+        Texts are normalized and deduplicated first. Each unique text is
+        looked up in the local EmbeddingStore, then Redis, and only the
+        remaining ones are sent to the embedding API. Duplicates share
+        the resulting vector.
+        
         Args:
             texts: List of input texts
+            ids: Optional node ID for each text, recorded in the store
+            persist: Write newly seen vectors to the EmbeddingStore
             
         Returns:
-            List of embedding vectors
+            List of embedding vectors aligned with texts
         """
         if not texts:
             logger.warning("Empty text list provided")
             return []
         
-        embeddings = []
-        cache_keys = [self._generate_cache_key(text) for text in texts]
+        # Deduplicate normalized texts, remembering where each one goes
+        unique_index: Dict[str, int] = {}
+        positions = [
+            unique_index.setdefault(normalize_text(text, self.normalization), len(unique_index))
+            for text in texts
+        ]
+        unique_texts = list(unique_index)
         
-        # Check cache for each text
-        to_compute = []
-        to_compute_indices = []
+        content_hashes = [self._content_hash(text) for text in unique_texts]
+        cache_keys = [
+            f"embedding:{self.model}:{CACHE_KEY_VERSION}:{content_hash}"
+            for content_hash in content_hashes
+        ]
         
-        for i, (text, cache_key) in enumerate(zip(texts, cache_keys)):
-            cached_embedding = cache_manager.get(cache_key)
-            if cached_embedding:
-                embeddings.append(cached_embedding)
-                logger.debug(f"Using cached embedding for text {i+1}/{len(texts)}")
-            else:
-                embeddings.append(None)
-                to_compute.append(text)
-                to_compute_indices.append(i)
+        # Check the local store, then Redis for whatever is left
+        embeddings = self.store.get_many(content_hashes) if self.store else [None] * len(unique_texts)
+        store_misses = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if store_misses:
+            cached = cache_manager.get_many([cache_keys[i] for i in store_misses])
+            for i, embedding in zip(store_misses, cached):
+                embeddings[i] = embedding
+        to_compute_indices = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        to_compute = [unique_texts[i] for i in to_compute_indices]
+        logger.debug(
+            f"{len(texts)} texts, {len(unique_texts)} unique: "
+            f"{len(unique_texts) - len(store_misses)} stored, "
+            f"{len(store_misses) - len(to_compute)} cached"
+        )
         
         # Compute missing embeddings
         if to_compute:
             logger.info(f"Computing {len(to_compute)} new embeddings")
             try:
-                response = self.client.embeddings.create(
-                    model=self.model,
-                    input=to_compute
-                )
+                computed = self._request_embeddings(to_compute)
                 
-                # Update results and cache
-                for idx, data in zip(to_compute_indices, response.data):
-                    embedding = data.embedding
+                # Update results
+                for idx, embedding in zip(to_compute_indices, computed):
                     embeddings[idx] = embedding
-                    
-                    # Cache the result
-                    cache_key = cache_keys[idx]
-                    cache_manager.set(
-                        cache_key,
-                        embedding,
-                        ttl=config.CACHE_TTL_EMBEDDINGS
-                    )
+                
+                # Cache all new results in one round trip
+                cache_manager.set_many(
+                    [(cache_keys[idx], embeddings[idx]) for idx in to_compute_indices],
+                    ttl=config.CACHE_TTL_EMBEDDINGS
+                )
                 
                 logger.info(f"Successfully computed and cached {len(to_compute)} embeddings")
             except Exception as e:
                 logger.error(f"Error in batch embedding: {e}")
                 raise
         
-        return embeddings
+        # Persist everything that did not come from the store, except
+        # vectors decoded from a lossy (float16/int8) cache entry
+        if self.store is not None and persist:
+            lossy = set()
+            if EMBEDDING_CACHE_DTYPE != "float32":
+                lossy = set(store_misses) - set(to_compute_indices)
+            if ids:
+                keep = [k for k, p in enumerate(positions) if p not in lossy]
+                self.store.add_many(
+                    [content_hashes[positions[k]] for k in keep],
+                    [embeddings[positions[k]] for k in keep],
+                    [ids[k] for k in keep]
+                )
+            else:
+                keep = [i for i in store_misses if i not in lossy]
+                if keep:
+                    self.store.add_many(
+                        [content_hashes[i] for i in keep],
+                        [embeddings[i] for i in keep]
+                    )
+        
+        with self._stats_lock:
+            self._stats["texts"] += len(texts)
+            self._stats["unique"] += len(unique_texts)
+            self._stats["store_hits"] += len(unique_texts) - len(store_misses)
+            self._stats["cache_hits"] += len(store_misses) - len(to_compute)
+            self._stats["computed"] += len(to_compute)
+        
+        if self.output_dim:
+            embeddings = list(truncate_matryoshka(np.stack(embeddings), self.output_dim))
+        return [embeddings[p] for p in positions]
+    
+    def is_available_many(self, texts: List[str]) -> List[bool]:
+        """
+        Check which texts embed_batch could serve without an API call.
+        
+        Args:
+            texts: Input texts
+            
+        Returns:
+            Whether each text's vector is in the store or the cache
+        """
+        normalized = [normalize_text(text, self.normalization) for text in texts]
+        cached = cache_manager.get_many([self._generate_cache_key(text) for text in normalized])
+        return [
+            vector is not None or (self.store is not None and self._content_hash(text) in self.store)
+            for text, vector in zip(normalized, cached)
+        ]
+    
+    def refresh_cache_ttl(self, texts: List[str], ttl: Optional[int] = None) -> int:
+        """
+        Extend the cache lifetime of texts' embeddings without rewriting them.
+        
+        Args:
+            texts: Input texts
+            ttl: New time-to-live in seconds (defaults to CACHE_TTL_EMBEDDINGS)
+            
+        Returns:
+            Number of cache entries refreshed
+        """
+        keys = [self._generate_cache_key(normalize_text(text, self.normalization)) for text in texts]
+        return cache_manager.expire_many(keys, ttl or config.CACHE_TTL_EMBEDDINGS)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Return counters of embedding work done and avoided.
+        
+        Returns:
+            Dict with texts requested, unique texts after normalization,
+            store hits, cache hits, texts sent to the API, duplicates
+            collapsed and the total number of embeddings not requested
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["duplicates_saved"] = stats["texts"] - stats["unique"]
+        stats["api_embeddings_saved"] = stats["texts"] - stats["computed"]
+        return stats
     
-    def clear_cache(self):
-        """Clear all embedding caches."""
+    def clear_cache(
+        self,
+        max_keys_per_second: Optional[float] = None,
+        include_store: bool = True
+    ) -> int:
+        """
+        Clear all embedding caches.
+        
+        The EmbeddingStore is read before Redis, so it is cleared too unless
+        include_store is False.
+        
+        Args:
+            max_keys_per_second: Optional cap on the deletion rate
+            include_store: Also remove every vector from the EmbeddingStore
+            
+        Returns:
+            Number of Redis keys and store vectors deleted
+        """
         logger.info("Clearing embedding cache")
-        cache_manager.clear_pattern(f"embedding:{self.model}:*")
+        removed = self.store.clear() if self.store is not None and include_store else 0
+        
+        next_report = 100000
+        
+        def report(deleted: int, scanned: int):
+            nonlocal next_report
+            if deleted >= next_report:
+                logger.info(f"Cleared {deleted} embedding keys so far")
+                next_report += 100000
+        
+        return removed + cache_manager.clear_pattern(
+            f"embedding:{self.model}:*",
+            max_keys_per_second=max_keys_per_second,
+            progress_callback=report
+        )
+    
+    def purge_legacy_cache(self) -> int:
+        """
+        Delete embedding entries written before content-hash keys.
+        
+        Legacy keys were either "embedding:<model>:<hash(text)>" (from
+        embed_batch) or "embedding:<md5>" (from the @cached decorator on
+        embed_single). Neither can be hit again, so this only reclaims
+        Redis memory ahead of their TTL.
+        
+        Returns:
+            Number of keys deleted
+        """
+        deleted = cache_manager.clear_pattern(f"embedding:{self.model}:[^v]*")
+        deleted += cache_manager.clear_pattern("embedding:" + "?" * 32)
+        logger.info(f"Purged {deleted} legacy embedding cache keys")
+        return deleted
 
 
-# Global instance
-embedding_service = EmbeddingService()
\ No newline at end of file
+# Global instance (created on first use)
+embedding_service = LazyProxy(EmbeddingService, "embedding_service")
\ No newline at end of file
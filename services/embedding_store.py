@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from logger import get_logger
+from services.atomic_files import replace_file
+
+try:
+    import fcntl
+except ImportError:  # no inter-process locking on Windows
+    fcntl = None
+
+logger = get_logger(__name__)
+
+class EmbeddingStore:
+    """
+    Append-only on-disk embedding store backed by a memory-mapped matrix.
+
+    Layout of the store directory:
+        meta.json    - vector dimension
+        vectors.f32  - little-endian float32 rows, appended in write order
+        index.tsv    - "content_hash<TAB>row<TAB>id" lines; a row gets one
+                       line when written and one per node ID linked to it
+
+    Vectors are written before their index lines, so a crash can only
+    leave unreferenced rows behind, never an index entry without data.
+    Writers hold an exclusive flock on store.lock and take their row
+    numbers from the file size, so several processes can share a store;
+    each one picks up the others' index lines before reading. clear()
+    swaps in new empty files, and readers drop their index when they see
+    index.tsv has a new inode.
+    """
+
+    def __init__(self, path: str, dim: Optional[int] = None):
+        """
+        Open (or create) an embedding store.
+
+        Args:
+            path: Store directory
+            dim: Vector dimension (read from meta.json if the store exists)
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._vectors_file = self.path / "vectors.f32"
+        self._index_file = self.path / "index.tsv"
+        self._meta_file = self.path / "meta.json"
+        self._lock_file = self.path / "store.lock"
+        self._lock = threading.RLock()
+        self._rows: Dict[str, int] = {}
+        self._ids: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._count = 0
+        self._index_offset = 0
+        self._index_inode: Optional[int] = None
+
+        self.dim = dim
+        with self._exclusive():
+            if self._meta_file.exists():
+                self.dim = json.loads(self._meta_file.read_text())["dim"]
+                if dim is not None and dim != self.dim:
+                    raise ValueError(f"Store at {path} has dimension {self.dim}, not {dim}")
+            elif dim is not None:
+                self._meta_file.write_text(json.dumps({"dim": dim}))
+            self._load()
+        logger.info(f"Opened EmbeddingStore at {path} with {len(self._rows)} vectors")
+
+    @contextmanager
+    def _exclusive(self):
+        """Hold the in-process lock and the inter-process file lock."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._lock_file, "a") as lock:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _load(self):
+        """Drop anything a crash left half-written, then read the index (caller holds the file lock)."""
+        if self.dim is None or not self._vectors_file.exists():
+            return
+        row_bytes = self.dim * 4
+        rows = self._vectors_file.stat().st_size // row_bytes
+        with open(self._vectors_file, "r+b") as f:
+            f.truncate(rows * row_bytes)
+        self._refresh()
+
+    def _refresh(self):
+        """Read index lines appended since the last call (by any process)."""
+        if self.dim is None and self._meta_file.exists():
+            self.dim = json.loads(self._meta_file.read_text())["dim"]
+        if self.dim is None or not self._index_file.exists():
+            return
+        with open(self._index_file, "rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_ino != self._index_inode:
+                # First read, or another process cleared the store
+                self._forget()
+                self._index_inode = st.st_ino
+            if st.st_size <= self._index_offset:
+                return
+            f.seek(self._index_offset)
+            data = f.read()
+        # Only whole lines; a writer may be halfway through the last one
+        data = data[:data.rfind(b"\n") + 1]
+        self._index_offset += len(data)
+        self._count = self._vectors_file.stat().st_size // (self.dim * 4)
+        for line in data.decode("utf-8").splitlines():
+            parts = line.split("\t")
+            if len(parts) != 3 or not parts[1].isdigit():
+                continue
+            content_hash, row, node_id = parts[0], int(parts[1]), parts[2]
+            if row >= self._count:
+                continue
+            self._rows[content_hash] = row
+            if node_id:
+                self._ids[node_id] = row
+
+    def _forget(self):
+        """Drop everything read from the index so far."""
+        self._rows = {}
+        self._ids = {}
+        self._matrix = None
+        self._count = 0
+        self._index_offset = 0
+
+    def _view(self) -> Optional[np.ndarray]:
+        """Return a read-only memory map covering every written row."""
+        if self._count == 0:
+            return None
+        if self._matrix is None or self._matrix.shape[0] != self._count:
+            self._matrix = np.memmap(
+                self._vectors_file, dtype="<f4", mode="r", shape=(self._count, self.dim)
+            )
+        return self._matrix
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+    def __contains__(self, content_hash: str) -> bool:
+        with self._lock:
+            self._refresh()
+            return content_hash in self._rows
+
+    def get_many(self, content_hashes: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up vectors by content hash.
+
+        Args:
+            content_hashes: Content hashes to look up
+
+        Returns:
+            Read-only row views aligned with content_hashes (None if absent)
+        """
+        with self._lock:
+            self._refresh()
+            matrix = self._view()
+            rows = [self._rows.get(content_hash) for content_hash in content_hashes]
+        if matrix is None:
+            return [None] * len(content_hashes)
+        return [matrix[row] if row is not None else None for row in rows]
+
+    def get_by_id(self, node_id: str) -> Optional[np.ndarray]:
+        """Look up the most recently stored vector for a node ID."""
+        with self._lock:
+            self._refresh()
+            matrix = self._view()
+            row = self._ids.get(node_id)
+        if matrix is None or row is None:
+            return None
+        return matrix[row]
+
+    def add_many(
+        self,
+        content_hashes: List[str],
+        vectors: List[np.ndarray],
+        ids: Optional[List[Optional[str]]] = None
+    ) -> int:
+        """
+        Append vectors that are not stored yet.
+
+        Args:
+            content_hashes: Content hash of each vector's source text
+            vectors: Vectors to store
+            ids: Optional node ID for each vector
+
+        Returns:
+            Number of vectors appended
+        """
+        ids = ids or [None] * len(content_hashes)
+        with self._exclusive():
+            # Another process may have stored some of these already
+            self._refresh()
+            new: Dict[str, np.ndarray] = {}
+            links = []
+            for content_hash, vector, node_id in zip(content_hashes, vectors, ids):
+                if content_hash not in self._rows and content_hash not in new:
+                    new[content_hash] = vector
+                if node_id:
+                    links.append((content_hash, node_id))
+
+            first_row = 0
+            if new:
+                matrix = np.asarray(list(new.values()), dtype="<f4")
+                if self.dim is None:
+                    self.dim = matrix.shape[1]
+                    self._meta_file.write_text(json.dumps({"dim": self.dim}))
+                elif matrix.shape[1] != self.dim:
+                    raise ValueError(f"Expected {self.dim}-d vectors, got {matrix.shape[1]}-d")
+
+                with open(self._vectors_file, "ab") as f:
+                    # Rows are numbered from the file itself, not this process's count
+                    f.seek(0, 2)
+                    first_row = f.tell() // (self.dim * 4)
+                    f.truncate(first_row * self.dim * 4)
+                    f.write(matrix.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._count = first_row + len(new)
+
+            lines = []
+            for offset, content_hash in enumerate(new):
+                self._rows[content_hash] = first_row + offset
+                lines.append(f"{content_hash}\t{first_row + offset}\t\n")
+            for content_hash, node_id in links:
+                row = self._rows[content_hash]
+                if self._ids.get(node_id) != row:
+                    self._ids[node_id] = row
+                    lines.append(f"{content_hash}\t{row}\t{node_id}\n")
+            if lines:
+                with open(self._index_file, "a", encoding="utf-8") as f:
+                    f.writelines(lines)
+                self._index_offset = self._index_file.stat().st_size
+
+            logger.debug(f"Appended {len(new)} vectors to EmbeddingStore")
+            return len(new)
+
+    def clear(self) -> int:
+        """
+        Remove every stored vector.
+
+        The vector and index files are replaced rather than truncated, so
+        other processes' memory maps stay valid until they notice.
+
+        Returns:
+            Number of vectors removed
+        """
+        with self._exclusive():
+            self._refresh()
+            removed = len(self._rows)
+            for target in (self._vectors_file, self._index_file):
+                replace_file(target, lambda f: None)
+            self._forget()
+            self._index_inode = os.stat(self._index_file).st_ino
+            logger.info(f"Cleared EmbeddingStore at {self.path} ({removed} vectors)")
+            return removed
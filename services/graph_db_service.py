@@ -1,11 +1,32 @@
+import hashlib
+import json
 from typing import List, Dict, Any, Optional
 from neo4j import GraphDatabase
 import config
 from logger import get_logger
+from lazy_proxy import LazyProxy
 from cache_manager import cached
 
 logger = get_logger(__name__)
 
+
+def neighborhood_cache_key(
+    service: "GraphDBService",
+    node_id: str,
+    depth: int = 1,
+    limit: int = 10
+) -> str:
+    """
+    Build the fetch_neighborhood cache key (without prefix).
+    
+    Combines the database URI with a hash of node_id, depth and limit, so
+    every worker reading the same database shares entries.
+    """
+    payload = json.dumps([node_id, depth, limit], separators=(",", ":"))
+    digest = hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+    return f"{service.uri}:{digest}"
+
+
 class GraphDBService:
     """Service for interacting with Neo4j graph database."""
     
@@ -23,6 +44,7 @@ class GraphDBService:
             user: Neo4j username
             password: Neo4j password
         """
+        self.uri = uri
         try:
             self.driver = GraphDatabase.driver(uri, auth=(user, password))
             # Test connection
@@ -130,7 +152,12 @@ class GraphDBService:
                 logger.error(f"Error creating relationship: {e}")
                 raise
     
-    @cached(prefix="graph_context", ttl=config.CACHE_TTL_GRAPH_CONTEXT)
+    @cached(
+        prefix="graph_context",
+        ttl=config.CACHE_TTL_GRAPH_CONTEXT,
+        stale_ttl=getattr(config, 'CACHE_STALE_TTL_GRAPH_CONTEXT', 86400),
+        key_builder=neighborhood_cache_key
+    )
     def fetch_neighborhood(
         self,
         node_id: str,
@@ -241,5 +268,5 @@ class GraphDBService:
                 return None
 
 
-# Global instance
-graph_db_service = GraphDBService()
\ No newline at end of file
+# Global instance (connects on first use)
+graph_db_service = LazyProxy(GraphDBService, "graph_db_service")
\ No newline at end of file
@@ -0,0 +1,602 @@
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from logger import get_logger
+from services.atomic_files import replace_file
+from services.quantization import QuantizedMatrix, l2_normalize
+
+try:
+    import fcntl
+except ImportError:  # no inter-process locking on Windows
+    fcntl = None
+
+logger = get_logger(__name__)
+
+
+def _compare(value: Any, op: str, operand: Any) -> bool:
+    if op == "$eq":
+        return value == operand
+    if op == "$ne":
+        return value != operand
+    if op == "$in":
+        return value in operand
+    if op == "$nin":
+        return value not in operand
+    if op == "$exists":
+        return (value is not None) == bool(operand)
+    if value is None:
+        return False
+    try:
+        if op == "$gt":
+            return value > operand
+        if op == "$gte":
+            return value >= operand
+        if op == "$lt":
+            return value < operand
+        if op == "$lte":
+            return value <= operand
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+
+def matches_filter(metadata: Dict[str, Any], filter_dict: Optional[Dict[str, Any]]) -> bool:
+    """
+    Evaluate a Pinecone-style metadata filter against one metadata dict.
+
+    Supports $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte, $exists, $and,
+    $or and bare values (implicit $eq). A list-valued field matches $eq /
+    $in when any element does, as in Pinecone.
+    """
+    if not filter_dict:
+        return True
+    for field, condition in filter_dict.items():
+        if field == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if field == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        value = metadata.get(field)
+        for op, operand in condition.items():
+            if isinstance(value, list) and op in ("$eq", "$in"):
+                ok = any(_compare(item, op, operand) for item in value)
+            elif isinstance(value, list) and op in ("$ne", "$nin"):
+                ok = all(_compare(item, op, operand) for item in value)
+            else:
+                ok = _compare(value, op, operand)
+            if not ok:
+                return False
+    return True
+
+
+class _IVF:
+    """Inverted-file partition of the rows around spherical k-means centroids."""
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> "_IVF":
+        rng = np.random.default_rng(seed)
+        sample = matrix[rng.choice(len(matrix), min(len(matrix), nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = l2_normalize(centroids)
+
+        assign = np.empty(len(matrix), dtype=np.int32)
+        for i in range(0, len(matrix), 65536):
+            assign[i:i + 65536] = np.argmax(matrix[i:i + 65536] @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(assign[order], np.arange(nlist + 1)).astype(np.int64)
+        return cls(centroids, order, offsets)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = min(nprobe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+
+
+class LocalVectorIndex:
+    """
+    In-process cosine-similarity index mirroring the Pinecone index.
+
+    Small indexes are searched exactly by brute force; from ivf_threshold
+    rows on, an IVF partition narrows each query to the nprobe closest
+    clusters. The partition is built by save(), or in a background thread
+    when a query finds it missing. With compression set, unfiltered brute
+    force searches rank a compressed in-memory copy (QuantizedMatrix) and
+    rescore the best candidates exactly against the memory-mapped rows.
+    "float16" and "int8" only save memory and are slower than exact
+    scoring; "binary" is the one faster option. Results use the same
+    {"id", "score", "metadata"} shape as Pinecone matches.
+
+    Saves and reloads hold a flock on a "<dir>.lock" file next to the
+    directory, and every query first checks (at most once per
+    reload_interval seconds) whether another process saved a newer copy.
+    meta.json's "complete" flag says whether the index holds everything
+    in its source; a mirror only serves searches while it is set.
+
+    Layout of the index directory:
+        meta.json    - dimension, row count, version and complete flag
+        vectors.npy  - unit-length float32 rows, memory-mapped on open
+        items.jsonl  - {"id", "metadata"} per row, in row order
+        ivf.npz      - IVF centroids and row lists for the saved version
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dim: Optional[int] = None,
+        ivf_threshold: int = 50000,
+        nprobe: int = 16,
+        reload_interval: float = 1.0,
+        compression: Optional[str] = None,
+        rescore_oversample: int = 4
+    ):
+        """
+        Open (or create) a local index.
+
+        Args:
+            path: Index directory
+            dim: Vector dimension (read from meta.json if the index exists)
+            ivf_threshold: Row count from which searches use IVF
+            nprobe: IVF clusters scanned per query
+            reload_interval: Seconds between checks for a newer saved copy
+            compression: QuantizedMatrix method ("float16", "int8" or
+                "binary") used to rank candidates, or None for exact scoring;
+                float16 and int8 cut memory, not latency
+            rescore_oversample: Candidates rescored per requested result
+        """
+        if compression is not None and compression not in QuantizedMatrix.METHODS:
+            raise ValueError(f"Unknown compression method: {compression}")
+        self.path = Path(path)
+        self.dim = dim
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.reload_interval = reload_interval
+        self.compression = compression
+        self.rescore_oversample = rescore_oversample
+        self._lock = threading.RLock()
+        self._lock_file = self.path.parent / f"{self.path.name}.lock"
+        self._ivf_building = False
+        self._reset()
+        with self._file_lock(shared=True):
+            self._load()
+        logger.info(f"Opened LocalVectorIndex at {path} with {len(self)} vectors")
+
+    def _reset(self):
+        self.version = 0
+        self.complete = False
+        self._matrix = np.zeros((0, self.dim or 0), dtype=np.float32)
+        self._pending: List[np.ndarray] = []
+        self._ids: List[str] = []
+        self._metadata: List[Dict[str, Any]] = []
+        self._rows: Dict[str, int] = {}
+        self._ivf: Optional[_IVF] = None
+        self._quantized: Optional[QuantizedMatrix] = None
+        self._quantized_version = None
+        self._dirty = False
+        # Unsaved changes by ID (True: upserted, False: deleted), replayed
+        # onto a newer saved copy when another process saved in between
+        self._changes: Dict[str, bool] = {}
+        self._cleared = False
+        self._loaded_mtime = None
+        self._checked_at = time.monotonic()
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        if fcntl is None:
+            yield
+            return
+        self._lock_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._lock_file, "a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _disk_mtime(self) -> Optional[int]:
+        try:
+            return (self.path / "meta.json").stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _reload(self):
+        """Replace the in-memory state by the saved copy (caller holds both locks)."""
+        self._reset()
+        self._load()
+        logger.info(f"Reloaded LocalVectorIndex at {self.path} ({len(self)} vectors)")
+
+    def refresh(self):
+        """Reload if another process saved a newer copy (checked at most every reload_interval)."""
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = time.monotonic()
+            if self._dirty or self._disk_mtime() == self._loaded_mtime:
+                return
+            with self._file_lock(shared=True):
+                self._reload()
+
+    def _load(self):
+        """Read the saved index (caller holds the file lock)."""
+        meta_file = self.path / "meta.json"
+        if not meta_file.exists():
+            return
+        self._loaded_mtime = meta_file.stat().st_mtime_ns
+        meta = json.loads(meta_file.read_text())
+        if self.dim is not None and meta["dim"] != self.dim:
+            raise ValueError(f"Index at {self.path} has dimension {meta['dim']}, not {self.dim}")
+        self.dim = meta["dim"]
+        self.version = meta.get("version", 0)
+        self.complete = meta.get("complete", False)
+
+        matrix = np.load(self.path / "vectors.npy", mmap_mode="r")
+        with open(self.path / "items.jsonl", encoding="utf-8") as f:
+            items = [json.loads(line) for line in f if line.strip()]
+        if len(items) != len(matrix) or len(matrix) != meta["count"]:
+            logger.warning(f"Local index at {self.path} is inconsistent, starting empty")
+            self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+            return
+        self._matrix = matrix
+        self._ids = [item["id"] for item in items]
+        self._metadata = [item.get("metadata") or {} for item in items]
+        self._rows = {node_id: row for row, node_id in enumerate(self._ids)}
+
+        ivf_file = self.path / "ivf.npz"
+        if ivf_file.exists():
+            data = np.load(ivf_file)
+            if int(data["version"]) == self.version:
+                self._ivf = _IVF(data["centroids"], data["order"], data["offsets"])
+        self._quantize(matrix)
+
+    def _quantize(self, matrix: np.ndarray):
+        if self.compression is not None and len(matrix):
+            self._quantized = QuantizedMatrix(matrix, self.compression)
+            self._quantized_version = self.version
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._rows
+
+    def _consolidate(self) -> np.ndarray:
+        """Stack pending rows onto the matrix (copying it off the memory map)."""
+        if self._pending:
+            self._matrix = np.vstack([np.asarray(self._matrix)] + self._pending)
+            self._pending = []
+        return self._matrix
+
+    def upsert(self, vectors: Iterable[Dict[str, Any]]) -> int:
+        """
+        Insert or replace vectors.
+
+        Args:
+            vectors: Dicts with 'id', 'values' and optional 'metadata'
+
+        Returns:
+            Number of vectors written
+        """
+        count = 0
+        with self._lock:
+            for vector in vectors:
+                values = l2_normalize(np.asarray(vector["values"], dtype=np.float32))
+                if self.dim is None:
+                    self.dim = len(values)
+                    self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+                if len(values) != self.dim:
+                    raise ValueError(f"Vector {vector['id']} has dimension {len(values)}, not {self.dim}")
+                row = self._rows.get(vector["id"])
+                if row is None:
+                    self._rows[vector["id"]] = len(self._ids)
+                    self._ids.append(vector["id"])
+                    self._metadata.append(vector.get("metadata") or {})
+                    self._pending.append(values[None, :])
+                else:
+                    matrix = self._consolidate()
+                    if not matrix.flags.writeable:
+                        matrix = self._matrix = np.array(matrix)
+                    matrix[row] = values
+                    self._metadata[row] = vector.get("metadata") or {}
+                self._changes[vector["id"]] = True
+                count += 1
+            if count:
+                self.version += 1
+                self._ivf = None
+                self._dirty = True
+        return count
+
+    def delete(self, ids: Iterable[str]) -> int:
+        """Remove vectors by ID; returns how many existed."""
+        with self._lock:
+            ids = list(ids)
+            # Recorded even if absent here: a newer saved copy may have them
+            self._changes.update((node_id, False) for node_id in ids)
+            self._dirty = self._dirty or bool(ids)
+            drop = {self._rows[node_id] for node_id in ids if node_id in self._rows}
+            if not drop:
+                return 0
+            keep = np.array([row not in drop for row in range(len(self._ids))])
+            self._matrix = np.asarray(self._consolidate())[keep]
+            self._ids = [node_id for row, node_id in enumerate(self._ids) if keep[row]]
+            self._metadata = [meta for row, meta in enumerate(self._metadata) if keep[row]]
+            self._rows = {node_id: row for row, node_id in enumerate(self._ids)}
+            self.version += 1
+            self._ivf = None
+            self._dirty = True
+            return len(drop)
+
+    def clear(self):
+        """Remove every vector."""
+        with self._lock:
+            self._matrix = np.zeros((0, self.dim or 0), dtype=np.float32)
+            self._pending = []
+            self._ids, self._metadata, self._rows = [], [], {}
+            self.version += 1
+            self._ivf = None
+            self._dirty = True
+            self._changes = {}
+            self._cleared = True
+
+    def _write_meta(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        replace_file(self.path / "meta.json", lambda f: json.dump({
+            "dim": self.dim,
+            "count": len(self),
+            "version": self.version,
+            "complete": self.complete,
+        }, f), mode="w")
+        self._loaded_mtime = self._disk_mtime()
+
+    def save(self, complete: Optional[bool] = None):
+        """
+        Write the index to disk (each file is replaced atomically).
+
+        If another process saved since this copy was loaded, its copy is
+        reloaded first and this process's unsaved changes are replayed on
+        top, so concurrent writers never drop each other's vectors.
+
+        Args:
+            complete: New value of the complete flag (None keeps the saved one)
+        """
+        with self._lock, self._file_lock():
+            if self._disk_mtime() != self._loaded_mtime:
+                self._merge_saved()
+            if complete is not None:
+                self.complete = complete
+            self._save()
+
+    def _merge_saved(self):
+        """Reload the saved copy and reapply unsaved changes (caller holds both locks)."""
+        upserts = [
+            {"id": node_id, "values": self._row(node_id), "metadata": self._metadata[self._rows[node_id]]}
+            for node_id, upserted in self._changes.items() if upserted and node_id in self._rows
+        ]
+        deletes = [node_id for node_id, upserted in self._changes.items() if not upserted]
+        cleared = self._cleared
+        self._reload()
+        if cleared:
+            self.clear()
+        self.delete(deletes)
+        self.upsert(upserts)
+
+    def _row(self, node_id: str) -> np.ndarray:
+        self._consolidate()
+        return np.array(self._matrix[self._rows[node_id]])
+
+    def _save(self):
+        with self._lock:
+            matrix = self._consolidate()
+            if self.dim is None:
+                return
+            if len(self) >= self.ivf_threshold and self._ivf is None:
+                self._ivf = self._build_ivf(matrix)
+            if self._quantized_version != self.version:
+                self._quantize(matrix)
+            self.path.mkdir(parents=True, exist_ok=True)
+            replace_file(self.path / "vectors.npy", lambda f: np.save(f, np.asarray(matrix, dtype=np.float32)))
+            replace_file(self.path / "items.jsonl", lambda f: f.writelines(
+                json.dumps({"id": node_id, "metadata": meta}, ensure_ascii=False) + "\n"
+                for node_id, meta in zip(self._ids, self._metadata)
+            ), mode="w")
+            if self._ivf is not None:
+                replace_file(self.path / "ivf.npz", lambda f: np.savez(
+                    f,
+                    version=self.version,
+                    centroids=self._ivf.centroids,
+                    order=self._ivf.order,
+                    offsets=self._ivf.offsets
+                ))
+            self._write_meta()
+            self._dirty = False
+            self._changes = {}
+            self._cleared = False
+        logger.info(f"Saved LocalVectorIndex at {self.path} ({len(self)} vectors)")
+
+    def replace_with(self, other: "LocalVectorIndex"):
+        """
+        Swap a fully built index directory in for this one and reopen it.
+
+        Readers in other processes pick the new copy up on their next
+        refresh; none of them ever sees a half-written index.
+        """
+        other.save()
+        with self._lock, self._file_lock():
+            old = self.path.with_name(f"{self.path.name}.old")
+            shutil.rmtree(old, ignore_errors=True)
+            if self.path.exists():
+                os.rename(self.path, old)
+            os.rename(other.path, self.path)
+            shutil.rmtree(old, ignore_errors=True)
+            self._reload()
+        other._lock_file.unlink(missing_ok=True)
+
+    def _build_ivf(self, matrix: np.ndarray) -> _IVF:
+        nlist = max(1, int(np.sqrt(len(matrix))))
+        logger.info(f"Building IVF with {nlist} lists over {len(matrix)} vectors")
+        return _IVF.build(matrix, nlist)
+
+    def _build_ivf_in_background(self, matrix: np.ndarray, version: int):
+        def build():
+            try:
+                ivf = self._build_ivf(matrix)
+                with self._lock:
+                    if self.version == version:
+                        self._ivf = ivf
+            except Exception as e:
+                logger.error(f"Error building IVF: {e}")
+            finally:
+                self._ivf_building = False
+
+        self._ivf_building = True
+        threading.Thread(target=build, name="ivf-build", daemon=True).start()
+
+    def _snapshot(
+        self
+    ) -> Tuple[np.ndarray, List[str], List[Dict[str, Any]], Optional[_IVF], Optional[QuantizedMatrix]]:
+        self.refresh()
+        with self._lock:
+            matrix = self._consolidate()
+            if len(self) >= self.ivf_threshold and self._ivf is None and not self._ivf_building:
+                # Searches stay exact until the partition is ready
+                self._build_ivf_in_background(matrix, self.version)
+            # The compressed copy is refreshed by save(); until then score exactly
+            quantized = self._quantized if self._quantized_version == self.version else None
+            return matrix, self._ids, self._metadata, self._ivf, quantized
+
+    def query(
+        self,
+        vector: np.ndarray,
+        top_k: int = 10,
+        filter_dict: Optional[Dict[str, Any]] = None,
+        include_metadata: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Find the most similar vectors.
+
+        Args:
+            vector: Query vector
+            top_k: Number of results
+            filter_dict: Pinecone-style metadata filter
+            include_metadata: Whether to include metadata
+
+        Returns:
+            Matches with id, score (cosine similarity) and metadata, best first
+        """
+        matrix, ids, metadata, ivf, quantized = self._snapshot()
+        if not len(matrix) or top_k <= 0:
+            return []
+        query = l2_normalize(vector)
+
+        rows = None
+        if ivf is not None:
+            rows = ivf.candidates(query, self.nprobe)
+        if filter_dict:
+            candidates = rows if rows is not None else range(len(matrix))
+            rows = np.array([row for row in candidates if matches_filter(metadata[row], filter_dict)], dtype=np.int64)
+            if len(rows) < top_k and ivf is not None:
+                # The probed clusters hold too few matches: scan every row instead
+                rows = np.array(
+                    [row for row in range(len(matrix)) if matches_filter(metadata[row], filter_dict)],
+                    dtype=np.int64
+                )
+            if not len(rows):
+                return []
+
+        if rows is None and quantized is not None:
+            best, scores = quantized.search(
+                query, top_k, rescore=lambda idx: matrix[idx], oversample=self.rescore_oversample
+            )
+            return self._matches(best, scores, ids, metadata, include_metadata)
+
+        scores = (matrix[rows] if rows is not None else matrix) @ query
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return self._matches(rows[best] if rows is not None else best, scores[best], ids, metadata, include_metadata)
+
+    @staticmethod
+    def _matches(
+        rows: np.ndarray,
+        scores: np.ndarray,
+        ids: List[str],
+        metadata: List[Dict[str, Any]],
+        include_metadata: bool
+    ) -> List[Dict[str, Any]]:
+        return [
+            {"id": ids[row], "score": float(score), "metadata": metadata[row] if include_metadata else {}}
+            for row, score in zip(rows.tolist(), scores.tolist())
+        ]
+
+    def query_many(
+        self,
+        vectors: np.ndarray,
+        top_k: int = 10,
+        filters: Optional[List[Optional[Dict[str, Any]]]] = None,
+        include_metadata: bool = True,
+        chunk_size: int = 256
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Run several queries; without filters, IVF or compression they share one matrix product.
+
+        Args:
+            vectors: (q, d) query matrix
+            top_k: Number of results per query
+            filters: Optional Pinecone-style filter per query
+            include_metadata: Whether to include metadata
+            chunk_size: Queries scored per matrix product
+
+        Returns:
+            One match list per query, aligned with vectors
+        """
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        filters = filters or [None] * len(vectors)
+        matrix, ids, metadata, ivf, quantized = self._snapshot()
+        if ivf is not None or quantized is not None or any(filters) or not len(matrix) or top_k <= 0:
+            return [self.query(vector, top_k, f, include_metadata) for vector, f in zip(vectors, filters)]
+
+        k = min(top_k, len(matrix))
+        results = []
+        for i in range(0, len(vectors), chunk_size):
+            scores = l2_normalize(vectors[i:i + chunk_size]) @ np.asarray(matrix).T
+            best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(scores, best, axis=1)
+            order = np.argsort(-best_scores, axis=1)
+            best = np.take_along_axis(best, order, axis=1)
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            results.extend(
+                self._matches(rows, row_scores, ids, metadata, include_metadata)
+                for rows, row_scores in zip(best, best_scores)
+            )
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and structure of the index."""
+        with self._lock:
+            return {
+                "dimension": self.dim,
+                "total_vector_count": len(self),
+                "version": self.version,
+                "ivf_lists": len(self._ivf.centroids) if self._ivf is not None else 0,
+                "compression": self.compression,
+            }
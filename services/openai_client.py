@@ -0,0 +1,409 @@
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import openai
+from openai import OpenAI
+import config
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Errors worth retrying: throttling, timeouts, dropped connections and 5xx
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        """
+        Initialize token bucket.
+
+        Args:
+            per_minute: Refill rate
+            capacity: Burst size (defaults to one minute's worth)
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1) -> float:
+        """
+        Take tokens, blocking until enough have accumulated.
+
+        Requests larger than the capacity are clamped to it so they can
+        still proceed once the bucket is full.
+
+        Returns:
+            Seconds spent waiting
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                delay = (amount - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def drain(self):
+        """Empty the bucket, e.g. after the server reports throttling."""
+        with self._lock:
+            self._tokens = 0.0
+            self._updated = time.monotonic()
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Concurrency limit tuned by AIMD.
+
+    Each success raises the limit by 1/limit (about +1 per round trip of
+    requests); each throttle halves it.
+    """
+
+    def __init__(self, initial: int = 8, minimum: int = 1, maximum: int = 64):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+class AdaptiveRateLimiter:
+    """
+    Request pacing tuned by AIMD on the rate the server actually accepts.
+
+    Requests are unpaced until the first throttle. A throttle pauses the
+    model until the server's Retry-After and sets the rate to `decrease`
+    times the success rate measured over the last second (at most once
+    per second); each success then raises it by `increase / rate`, i.e.
+    by about `increase` requests/s per second. Paced requests are spread
+    1/rate apart, so requests resuming after a pause do not retry at once.
+    """
+
+    def __init__(
+        self,
+        maximum: float,
+        minimum: float = 0.5,
+        increase: float = 1.0,
+        decrease: float = 0.7
+    ):
+        """
+        Initialize rate limiter.
+
+        Args:
+            maximum: Requests per second above which pacing is dropped
+            minimum: Lowest rate in requests per second
+            increase: Additive increase in requests/s per second
+            decrease: Multiplicative decrease on a throttle
+        """
+        self.rate: Optional[float] = None
+        self.maximum = maximum
+        self.minimum = minimum
+        self.increase = increase
+        self.decrease = decrease
+        self._next = 0.0
+        self._decreased_at = float("-inf")
+        self._successes = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Wait for this request's slot.
+
+        Returns:
+            Seconds spent waiting
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            if self.rate is not None:
+                self._next = slot + 1.0 / self.rate
+            elif slot > now:
+                # Unpaced but paused: still spread the resumed requests
+                self._next = slot + random.uniform(0, 0.01)
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+        return max(delay, 0.0)
+
+    def success(self):
+        with self._lock:
+            now = time.monotonic()
+            self._successes.append(now)
+            while self._successes and self._successes[0] < now - 1.0:
+                self._successes.popleft()
+            if self.rate is not None:
+                self.rate += self.increase / self.rate
+                if self.rate >= self.maximum:
+                    self.rate = None
+
+    def throttle(self, pause: float):
+        """Pause until `pause` seconds from now and lower the rate."""
+        with self._lock:
+            now = time.monotonic()
+            self._next = max(self._next, now + pause)
+            if now - self._decreased_at < 1.0:
+                return
+            self._decreased_at = now
+            measured = sum(1 for t in self._successes if t >= now - 1.0)
+            current = self.rate if self.rate is not None else float("inf")
+            self.rate = max(self.minimum, self.decrease * min(current, max(measured, self.minimum)))
+            logger.warning(f"Throttled: pacing requests at {self.rate:.1f}/s, paused {pause:.2f}s")
+
+
+class _ModelLimits:
+    """Rate and concurrency limiters for one model."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, max_concurrency: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.pacing = AdaptiveRateLimiter(maximum=requests_per_minute / 60.0)
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            initial=min(8, max_concurrency), maximum=max_concurrency
+        )
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked to wait (retry-after-ms / retry-after headers), if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(error, "headers", None) or getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def backoff_delay(
+    attempt: int,
+    error: Optional[Exception] = None,
+    base_backoff: float = 0.5,
+    max_backoff: float = 30.0
+) -> float:
+    """
+    Delay before retrying a failed request.
+
+    Args:
+        attempt: Zero-based number of the attempt that failed
+        error: The failure; a Retry-After it carries takes precedence
+        base_backoff: First backoff delay in seconds
+        max_backoff: Longest backoff delay in seconds
+
+    Returns:
+        Retry-After (capped) plus up to 25% jitter, else full-jitter
+        exponential backoff
+    """
+    wait = retry_after(error) if error is not None else None
+    if wait is not None:
+        return min(max_backoff, wait) * random.uniform(1.0, 1.25)
+    return random.uniform(0, min(max_backoff, base_backoff * 2 ** attempt))
+
+
+class RateLimitedOpenAI:
+    """
+    OpenAI client wrapper shared by the embedding and chat services.
+
+    Every call passes through per-model request and token buckets, an
+    adaptive request rate and an adaptive concurrency limit. A throttle
+    pauses the whole model until the server's Retry-After (capped at
+    max_backoff, plus jitter) and lowers its rate; other retryable
+    failures are retried with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = getattr(config, 'OPENAI_API_KEY', None),
+        base_url: Optional[str] = getattr(config, 'OPENAI_BASE_URL', None),
+        requests_per_minute: float = getattr(config, 'OPENAI_REQUESTS_PER_MINUTE', 3000),
+        tokens_per_minute: float = getattr(config, 'OPENAI_TOKENS_PER_MINUTE', 1000000),
+        model_limits: Optional[Dict[str, Tuple[float, float]]] = getattr(config, 'OPENAI_MODEL_RATE_LIMITS', None),
+        max_concurrency: int = getattr(config, 'OPENAI_MAX_CONCURRENCY', 32),
+        max_retries: int = getattr(config, 'OPENAI_MAX_RETRIES', 5),
+        base_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        client: Optional[OpenAI] = None
+    ):
+        """
+        Initialize the rate-limited client.
+
+        Args:
+            api_key: OpenAI API key
+            base_url: Alternative API endpoint (e.g. a local fake server)
+            requests_per_minute: Default request budget per model
+            tokens_per_minute: Default token budget per model
+            model_limits: Per-model (requests_per_minute, tokens_per_minute) overrides
+            max_concurrency: Upper bound for the adaptive concurrency limit
+            max_retries: Retries after the first attempt
+            base_backoff: First backoff delay in seconds
+            max_backoff: Longest backoff delay in seconds
+            client: Pre-built OpenAI client (its own retries should be off)
+        """
+        # Retries happen here, so the SDK must not retry on its own
+        self.client = client or OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.model_limits = model_limits or {}
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._limits: Dict[str, _ModelLimits] = {}
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._metrics = {
+            "requests": 0,
+            "tokens": 0,
+            "retries": 0,
+            "throttled": 0,
+            "failures": 0,
+            "rate_limit_wait_s": 0.0,
+        }
+
+    def _limits_for(self, model: str) -> _ModelLimits:
+        with self._lock:
+            if model not in self._limits:
+                rpm, tpm = self.model_limits.get(model, (self.requests_per_minute, self.tokens_per_minute))
+                self._limits[model] = _ModelLimits(rpm, tpm, self.max_concurrency)
+            return self._limits[model]
+
+    def _count(self, name: str, amount: float = 1):
+        with self._lock:
+            self._metrics[name] += amount
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Delay before the next attempt: jittered Retry-After if given, else full-jitter exponential."""
+        return backoff_delay(attempt, error, self.base_backoff, self.max_backoff)
+
+    def call(self, model: str, tokens: int, func: Callable[[], Any]) -> Any:
+        """
+        Run an API call under the model's rate and concurrency limits.
+
+        Args:
+            model: Model name (selects the limit set)
+            tokens: Estimated tokens the call consumes
+            func: Zero-argument function performing the request
+
+        Returns:
+            The function's result
+        """
+        limits = self._limits_for(model)
+        for attempt in range(self.max_retries + 1):
+            waited = limits.requests.acquire(1) + limits.tokens.acquire(tokens)
+            waited += limits.pacing.acquire()
+            self._count("rate_limit_wait_s", waited)
+            limits.concurrency.acquire()
+            throttled = False
+            try:
+                result = func()
+                limits.pacing.success()
+                self._count("requests")
+                self._count("tokens", tokens)
+                return result
+            except RETRYABLE_ERRORS as e:
+                throttled = isinstance(e, openai.RateLimitError)
+                delay = self._backoff(attempt, e)
+                if throttled:
+                    self._count("throttled")
+                    # Pause every caller of this model, not just this one;
+                    # the paced slots then provide the spacing
+                    limits.pacing.throttle(delay)
+                    delay = 0.0
+                if attempt == self.max_retries:
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                logger.warning(
+                    f"OpenAI {type(e).__name__} for {model}, "
+                    f"retry {attempt + 1}/{self.max_retries} in {delay:.2f}s"
+                )
+            except Exception:
+                self._count("failures")
+                raise
+            finally:
+                limits.concurrency.release(throttled=throttled)
+            time.sleep(delay)
+
+    def create_embeddings(self, model: str, input: List[str], tokens: Optional[int] = None):
+        """Rate-limited client.embeddings.create."""
+        tokens = tokens if tokens is not None else sum(len(text) // 4 + 1 for text in input)
+        return self.call(model, tokens, lambda: self.client.embeddings.create(model=model, input=input))
+
+    def create_chat_completion(self, model: str, messages: List[Dict[str, str]], **kwargs):
+        """Rate-limited client.chat.completions.create."""
+        tokens = sum(len(message.get("content") or "") // 4 + 4 for message in messages)
+        tokens += kwargs.get("max_tokens") or 0
+        return self.call(
+            model,
+            tokens,
+            lambda: self.client.chat.completions.create(model=model, messages=messages, **kwargs)
+        )
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Return throughput and throttling metrics.
+
+        Returns:
+            Counters plus requests/tokens per second since creation and the
+            current adaptive concurrency limit and request rate (None while
+            unpaced) per model
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+            limits = {model: round(limit.concurrency.limit, 2) for model, limit in self._limits.items()}
+            rates = {
+                model: round(limit.pacing.rate, 1) if limit.pacing.rate is not None else None
+                for model, limit in self._limits.items()
+            }
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        metrics["requests_per_s"] = metrics["requests"] / elapsed
+        metrics["tokens_per_s"] = metrics["tokens"] / elapsed
+        metrics["concurrency_limits"] = limits
+        metrics["request_rates"] = rates
+        return metrics
+
+
+_openai_client: Optional[RateLimitedOpenAI] = None
+_openai_client_lock = threading.Lock()
+
+
+def get_openai_client() -> RateLimitedOpenAI:
+    """Return the process-wide rate-limited OpenAI client, creating it on first use."""
+    global _openai_client
+    if _openai_client is None:
+        with _openai_client_lock:
+            if _openai_client is None:
+                _openai_client = RateLimitedOpenAI()
+    return _openai_client
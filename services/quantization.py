@@ -0,0 +1,267 @@
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    """Scale rows (or a single vector) to unit length."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def truncate_matryoshka(matrix: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Keep the first dim components and renormalize.
+
+    Only meaningful for Matryoshka-trained models (e.g. OpenAI's
+    text-embedding-3 family), whose leading components carry most of the
+    signal.
+    """
+    return l2_normalize(np.asarray(matrix)[..., :dim])
+
+
+class PCAReducer:
+    """Linear dimensionality reduction fitted on a sample of stored vectors."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+
+    def fit(self, matrix: np.ndarray) -> "PCAReducer":
+        matrix = np.asarray(matrix, dtype=np.float32)
+        self.mean = matrix.mean(axis=0)
+        # Right singular vectors of the centered data are the principal axes
+        _, _, vt = np.linalg.svd(matrix - self.mean, full_matrices=False)
+        self.components = vt[:self.dim].astype(np.float32)
+        return self
+
+    def transform(self, matrix: np.ndarray) -> np.ndarray:
+        return l2_normalize((np.asarray(matrix, dtype=np.float32) - self.mean) @ self.components.T)
+
+    def save(self, path: str):
+        np.savez(path, mean=self.mean, components=self.components)
+
+    @classmethod
+    def load(cls, path: str) -> "PCAReducer":
+        data = np.load(path)
+        reducer = cls(data["components"].shape[0])
+        reducer.mean, reducer.components = data["mean"], data["components"]
+        return reducer
+
+
+def quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric per-row int8 quantization.
+
+    Returns:
+        (codes, scales) with matrix ~= codes * scales[:, None]
+    """
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def dequantize_int8(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return codes.astype(np.float32) * scales[:, None]
+
+
+def quantize_binary(matrix: np.ndarray) -> np.ndarray:
+    """Pack the sign of each component into bits (dim / 8 bytes per row)."""
+    return np.packbits(np.atleast_2d(matrix) > 0, axis=1)
+
+
+# Number of set bits for every byte value, for Hamming distances on numpy
+# versions without np.bitwise_count (< 2.0)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# Rows dequantized to float32 at a time when scoring, bounding the temporary
+SCORE_BLOCK_ROWS = 16384
+
+
+class QuantizedMatrix:
+    """
+    Compact copy of an embedding matrix for approximate scoring.
+
+    Candidates are ranked on the compressed codes, then optionally
+    rescored with exact cosine similarity against the original vectors
+    (e.g. rows of an EmbeddingStore), which keeps recall close to exact
+    search at a fraction of the memory.
+
+    float16 and int8 trade speed for memory: numpy has no fast low
+    precision matmul, so their codes are dequantized to float32 block by
+    block and score somewhat slower than an exact float32 matmul. Only
+    binary codes (Hamming distance via popcount) are faster than exact
+    scoring.
+    """
+
+    METHODS = ("float32", "float16", "int8", "binary")
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        method: str = "int8",
+        dim: Optional[int] = None,
+        reducer: Optional[PCAReducer] = None
+    ):
+        """
+        Build a quantized matrix.
+
+        Args:
+            matrix: (n, d) embedding matrix
+            method: "float32", "float16", "int8" or "binary"
+            dim: Optional Matryoshka truncation before quantizing
+            reducer: Optional fitted PCAReducer applied before quantizing
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown quantization method: {method}")
+        self.method = method
+        self.dim = dim
+        self.reducer = reducer
+        reduced = self._reduce(matrix)
+        self.scales = None
+        if method == "int8":
+            self.codes, self.scales = quantize_int8(reduced)
+        elif method == "binary":
+            self.codes = quantize_binary(reduced)
+        else:
+            self.codes = reduced.astype(method)
+
+    def _reduce(self, matrix: np.ndarray) -> np.ndarray:
+        matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+        if self.reducer is not None:
+            return self.reducer.transform(matrix)
+        if self.dim is not None:
+            return truncate_matryoshka(matrix, self.dim)
+        return l2_normalize(matrix)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by codes and scale factors."""
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate similarity of the query to every row (higher is closer)."""
+        query = self._reduce(query)[0]
+        if self.method == "binary":
+            return -self._hamming(quantize_binary(query)[0]).astype(np.float32)
+        if self.method == "float32":
+            return self.codes @ query
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for i in range(0, len(self.codes), SCORE_BLOCK_ROWS):
+            j = i + SCORE_BLOCK_ROWS
+            scores[i:j] = self.codes[i:j].astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def _hamming(self, bits: np.ndarray) -> np.ndarray:
+        """Hamming distance from packed query bits to every row."""
+        codes = self.codes
+        if not hasattr(np, "bitwise_count"):
+            return _POPCOUNT[np.bitwise_xor(codes, bits)].sum(axis=1, dtype=np.int32)
+        if codes.shape[1] % 8 == 0 and codes.flags.c_contiguous:
+            # Count whole 64-bit words instead of single bytes
+            codes, bits = codes.view(np.uint64), bits.view(np.uint64)
+        return np.bitwise_count(np.bitwise_xor(codes, bits)).sum(axis=1, dtype=np.int32)
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int = 10,
+        rescore: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+        oversample: int = 4
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the rows most similar to a query.
+
+        Args:
+            query: Query vector (full dimension)
+            top_k: Number of results
+            rescore: Optional function mapping row indices to their original
+                vectors; the top top_k * oversample candidates are then
+                re-ranked by exact cosine similarity
+            oversample: Candidate multiplier for rescoring
+
+        Returns:
+            (row indices, scores), best first
+        """
+        scores = self.scores(query)
+        k = min(len(scores), top_k * oversample if rescore else top_k)
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        if rescore is not None:
+            exact = l2_normalize(rescore(candidates)) @ l2_normalize(query)
+            order = np.argsort(-exact)[:top_k]
+            return candidates[order], exact[order]
+        order = np.argsort(-scores[candidates])
+        return candidates[order], scores[candidates][order]
+
+
+def evaluate_recall(
+    matrix: np.ndarray,
+    queries: np.ndarray,
+    top_k: int = 10,
+    configs: Optional[List[Dict]] = None
+) -> List[Dict]:
+    """
+    Measure recall@k against exact cosine search for several compressions.
+
+    Args:
+        matrix: (n, d) corpus embeddings
+        queries: (q, d) query embeddings
+        top_k: Neighbors compared per query
+        configs: QuantizedMatrix keyword sets; each may also set "rescore"
+            (bool) and "pca" (target dim, fitted on matrix)
+
+    Returns:
+        One row per config with bytes/vector, recall@k and query latency
+    """
+    configs = configs or [
+        {"method": "float32"},
+        {"method": "float16"},
+        {"method": "int8"},
+        {"method": "binary"},
+        {"method": "binary", "rescore": True},
+        {"method": "int8", "dim": 512},
+        {"method": "int8", "pca": 256},
+    ]
+    matrix = l2_normalize(matrix)
+    queries = l2_normalize(queries)
+    exact = [set(np.argsort(-(matrix @ query))[:top_k]) for query in queries]
+
+    results = []
+    for cfg in configs:
+        cfg = dict(cfg)
+        rescore = cfg.pop("rescore", False)
+        pca_dim = cfg.pop("pca", None)
+        if pca_dim:
+            cfg["reducer"] = PCAReducer(pca_dim).fit(matrix)
+        quantized = QuantizedMatrix(matrix, **cfg)
+
+        start = time.perf_counter()
+        hits = 0
+        for query, truth in zip(queries, exact):
+            rows, _ = quantized.search(query, top_k, rescore=(lambda idx: matrix[idx]) if rescore else None)
+            hits += len(truth & set(rows.tolist()))
+        elapsed = time.perf_counter() - start
+
+        label = cfg["method"]
+        if cfg.get("dim"):
+            label += f"@{cfg['dim']}"
+        if pca_dim:
+            label += f"+pca{pca_dim}"
+        if rescore:
+            label += "+rescore"
+        results.append({
+            "config": label,
+            "bytes_per_vector": quantized.nbytes / len(matrix),
+            "recall": hits / (len(queries) * top_k),
+            "ms_per_query": elapsed / len(queries) * 1e3,
+        })
+    return results
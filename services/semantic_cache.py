@@ -0,0 +1,161 @@
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Hashable, List, Optional
+import numpy as np
+import config
+from logger import get_logger
+from services.quantization import l2_normalize
+
+logger = get_logger(__name__)
+
+
+class SemanticCache:
+    """
+    In-process cache of chat results keyed by query embedding.
+
+    A lookup returns the stored result of the most similar live entry if
+    its cosine similarity reaches the threshold, so paraphrases of a
+    recent question skip retrieval and generation. Entries live in a
+    fixed-size matrix; when it is full the entry closest to expiry (the
+    oldest) is replaced.
+
+    A share of hits (sample_rate) is meant to be re-checked by the caller
+    against a fresh retrieval; the outcomes are kept in `samples` and
+    counted as verified or false hits, giving a running false-hit rate to
+    tune the threshold with.
+    """
+
+    def __init__(
+        self,
+        threshold: float = getattr(config, 'SEMANTIC_CACHE_THRESHOLD', 0.92),
+        max_entries: int = getattr(config, 'SEMANTIC_CACHE_MAX_ENTRIES', 1000),
+        ttl: float = getattr(config, 'SEMANTIC_CACHE_TTL', 3600),
+        sample_rate: float = getattr(config, 'SEMANTIC_CACHE_SAMPLE_RATE', 0.05),
+        max_samples: int = 100
+    ):
+        """
+        Initialize semantic cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a hit
+            max_entries: Capacity
+            ttl: Entry lifetime in seconds
+            sample_rate: Share of hits to verify against a fresh result
+            max_samples: Verification outcomes kept for inspection
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.sample_rate = sample_rate
+        self.samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._stats = {"lookups": 0, "hits": 0, "stores": 0, "sampled": 0, "false_hits": 0}
+
+    def _live(self, scope: Hashable) -> np.ndarray:
+        live = self._expires > time.time()
+        for slot in np.flatnonzero(live):
+            if self._entries[slot]["scope"] != scope:
+                live[slot] = False
+        return live
+
+    def lookup(self, vector: np.ndarray, scope: Hashable = None) -> Optional[Dict[str, Any]]:
+        """
+        Find the closest cached query.
+
+        Args:
+            vector: Query embedding
+            scope: Only entries stored with an equal scope match (e.g. top_k)
+
+        Returns:
+            Dict with "result", "query" (the cached query), "similarity"
+            and "slot", or None on a miss
+        """
+        query = l2_normalize(vector)
+        with self._lock:
+            self._stats["lookups"] += 1
+            if self._vectors is None:
+                return None
+            live = self._live(scope)
+            if not live.any():
+                return None
+            scores = np.where(live, self._vectors @ query, -np.inf)
+            slot = int(np.argmax(scores))
+            if scores[slot] < self.threshold:
+                return None
+            self._stats["hits"] += 1
+            entry = self._entries[slot]
+            return {
+                "result": entry["result"],
+                "query": entry["query"],
+                "similarity": float(scores[slot]),
+                "slot": slot,
+            }
+
+    def store(self, query: str, vector: np.ndarray, result: Any, scope: Hashable = None):
+        """Cache a result under its query embedding."""
+        vector = l2_normalize(vector)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            slot = int(np.argmin(self._expires))
+            self._vectors[slot] = vector
+            self._expires[slot] = time.time() + self.ttl
+            self._entries[slot] = {"query": query, "result": result, "scope": scope}
+            self._stats["stores"] += 1
+
+    def invalidate(self, hit: Dict[str, Any]):
+        """Drop the entry behind a hit (e.g. after it proved to be a false hit)."""
+        with self._lock:
+            entry = self._entries[hit["slot"]]
+            if entry is not None and entry["query"] == hit["query"]:
+                self._expires[hit["slot"]] = 0.0
+                self._entries[hit["slot"]] = None
+
+    def clear(self):
+        with self._lock:
+            self._expires[:] = 0.0
+            self._entries = [None] * self.max_entries
+
+    def should_sample(self) -> bool:
+        """Decide whether to verify the current hit."""
+        return random.random() < self.sample_rate
+
+    def record_sample(self, query: str, hit: Dict[str, Any], false_hit: bool, agreement: float):
+        """
+        Record the outcome of a verified hit.
+
+        Args:
+            query: The new query
+            hit: The lookup result that was verified
+            false_hit: Whether the fresh result disagreed with the cached one
+            agreement: Similarity of the fresh and cached results (0-1)
+        """
+        with self._lock:
+            self._stats["sampled"] += 1
+            self._stats["false_hits"] += int(false_hit)
+        self.samples.append({
+            "query": query,
+            "cached_query": hit["query"],
+            "similarity": hit["similarity"],
+            "agreement": agreement,
+            "false_hit": false_hit,
+        })
+        if false_hit:
+            logger.warning(
+                f"Semantic cache false hit: '{query[:50]}' matched '{hit['query'][:50]}' "
+                f"(similarity {hit['similarity']:.3f}, agreement {agreement:.2f})"
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit rate, false-hit rate and size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = int((self._expires > time.time()).sum())
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        stats["false_hit_rate"] = stats["false_hits"] / stats["sampled"] if stats["sampled"] else 0.0
+        return stats
@@ -1,19 +1,150 @@
-from typing import List, Dict, Any, Optional
+import hashlib
+import json
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence, Union
+import numpy as np
 from pinecone import Pinecone, ServerlessSpec
 import config
 from logger import get_logger
-from cache_manager import cached
-from services.embedding_service import embedding_service
+from lazy_proxy import LazyProxy
+from cache_manager import cache_manager, cached
+from services.embedding_service import embedding_service, normalize_text
+from services.local_vector_index import LocalVectorIndex
+from services.openai_client import backoff_delay
+
+try:
+    from urllib3.exceptions import MaxRetryError, ProtocolError, TimeoutError as URLLib3TimeoutError
+    _TRANSPORT_ERRORS = (MaxRetryError, ProtocolError, URLLib3TimeoutError)
+except ImportError:  # only the REST client depends on urllib3
+    _TRANSPORT_ERRORS = ()
 
 logger = get_logger(__name__)
 
+
+def _as_float_list(values: Union[Sequence[float], np.ndarray]) -> List[float]:
+    """Convert an embedding (list or NumPy array) to the plain list Pinecone expects."""
+    if isinstance(values, np.ndarray):
+        return values.astype(np.float32, copy=False).tolist()
+    return list(values)
+
+
+# Upper bound on one float32 in a JSON request, e.g. "-1.2345678901234567e-05,"
+JSON_FLOAT_BYTES = 24
+
+UPSERT_BASE_BACKOFF = getattr(config, 'PINECONE_UPSERT_BASE_BACKOFF', 0.5)
+UPSERT_MAX_BACKOFF = getattr(config, 'PINECONE_UPSERT_MAX_BACKOFF', 30.0)
+
+
+def _is_transient(error: Exception) -> bool:
+    """Whether a failed Pinecone request is worth retrying (timeouts, connection errors, 429, 5xx)."""
+    if isinstance(error, (ConnectionError, TimeoutError) + _TRANSPORT_ERRORS):
+        return True
+    # status_code on pinecone >= 6, status on the older OpenAPI exceptions
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    return isinstance(status, int) and (status in (408, 429) or status >= 500)
+
+
+def _filters_for(
+    filter_dict: Union[None, Dict, List[Optional[Dict]]],
+    count: int
+) -> List[Optional[Dict]]:
+    """Expand one shared filter, or validate a per-query list of filters."""
+    if isinstance(filter_dict, list):
+        if len(filter_dict) != count:
+            raise ValueError(f"Got {len(filter_dict)} filters for {count} queries")
+        return filter_dict
+    return [filter_dict] * count
+
+
+SEARCH_CACHE_PREFIX = "vector_search"
+SEARCH_CACHE_TTL = config.CACHE_TTL_SEARCH_RESULTS
+SEARCH_CACHE_STALE_TTL = getattr(config, 'CACHE_STALE_TTL_SEARCH_RESULTS', 3600)
+# Seconds a process reuses the index's cache generation before re-reading it
+SEARCH_GENERATION_CHECK_INTERVAL = getattr(config, 'SEARCH_GENERATION_CHECK_INTERVAL', 1.0)
+
+
+def _canonical_json(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def canonical_filter(filter_dict: Optional[Dict]) -> Optional[Dict]:
+    """
+    Rewrite a metadata filter into one canonical form.
+    
+    Bare values become {"$eq": value} and the order-insensitive lists of
+    $in, $nin, $and and $or are sorted, so equivalent filters produce
+    the same cache key.
+    """
+    if not filter_dict:
+        return None
+    canonical = {}
+    for field, condition in filter_dict.items():
+        if field in ("$and", "$or"):
+            canonical[field] = sorted((canonical_filter(sub) for sub in condition), key=_canonical_json)
+        elif isinstance(condition, dict):
+            canonical[field] = {
+                op: sorted(operand, key=_canonical_json) if isinstance(operand, list) else operand
+                for op, operand in condition.items()
+            }
+        else:
+            canonical[field] = {"$eq": condition}
+    return canonical
+
+
+def cache_top_k(top_k: int) -> int:
+    """
+    Round top_k up to the result size that is fetched and cached.
+    
+    Sizes start at SEARCH_CACHE_MIN_TOP_K and double, so a cached top-20
+    result also answers top-5 and top-10 requests.
+    """
+    size = getattr(config, 'SEARCH_CACHE_MIN_TOP_K', 20)
+    while size < top_k:
+        size *= 2
+    return size
+
+
+def search_cache_key(
+    service: "VectorDBService",
+    query_text: str,
+    top_k: int,
+    filter_dict: Optional[Dict] = None,
+    include_metadata: bool = True
+) -> str:
+    """
+    Build the search cache key (without prefix).
+    
+    Combines the index name, version and cache generation, the embedding
+    model and a hash of the normalized query, top_k, canonical filter and
+    metadata flag. Nothing process-specific goes in, so all workers share
+    entries.
+    """
+    payload = _canonical_json({
+        "q": normalize_text(query_text, embedding_service.normalization),
+        "k": top_k,
+        "f": canonical_filter(filter_dict),
+        "m": include_metadata,
+    })
+    digest = hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+    return (
+        f"{service.index_name}:{service.index_version}:g{service.search_generation()}:"
+        f"{embedding_service.model}:{digest}"
+    )
+
+
 class VectorDBService:
     """Service for interacting with Pinecone vector database."""
     
     def __init__(
         self,
         index_name: str = config.PINECONE_INDEX_NAME,
-        dimension: int = config.PINECONE_VECTOR_DIM
+        dimension: int = config.PINECONE_VECTOR_DIM,
+        mode: str = getattr(config, 'VECTOR_INDEX_MODE', "pinecone"),
+        local_index_dir: str = getattr(config, 'LOCAL_VECTOR_INDEX_DIR', ".cache/vector_index")
     ):
         """
         Initialize Pinecone service.
@@ -21,18 +152,49 @@ class VectorDBService:
         Args:
             index_name: Name of the Pinecone index
             dimension: Vector dimension
+            mode: "pinecone" (Pinecone only), "local" (search a local mirror
+                first, with Pinecone as the source of truth) or "offline"
+                (local index only, no Pinecone connection)
+            local_index_dir: Directory holding local index mirrors
         """
+        if mode not in ("pinecone", "local", "offline"):
+            raise ValueError(f"Unknown vector index mode: {mode}")
         self.index_name = index_name
         self.dimension = dimension
+        self.mode = mode
+        # Part of every search cache key; bump after re-indexing outside this service
+        self.index_version = str(getattr(config, 'VECTOR_INDEX_VERSION', 1))
+        # Bumped in Redis on every write, so stale search results stop matching
+        self._generation_key = f"{SEARCH_CACHE_PREFIX}_generation:{index_name}"
+        self._generation = 0
+        self._generation_checked_at = None
+        self.pc = None
+        self.index = None
+        self.local = None
         
-        # Initialize Pinecone client
-        self.pc = Pinecone(api_key=config.PINECONE_API_KEY)
+        if mode != "offline":
+            # Initialize Pinecone client
+            self.pc = Pinecone(api_key=config.PINECONE_API_KEY)
+            
+            # Create or connect to index
+            self._ensure_index_exists()
+            self.index = self.pc.Index(self.index_name)
         
-        # Create or connect to index
-        self._ensure_index_exists()
-        self.index = self.pc.Index(self.index_name)
+        if mode != "pinecone":
+            self.local = self._open_local(Path(local_index_dir) / index_name)
+            if mode == "local" and not self.local.complete:
+                logger.warning("Local vector index is not a complete mirror; searching Pinecone until sync_local_index()")
         
-        logger.info(f"Initialized VectorDBService with index: {index_name}")
+        logger.info(f"Initialized VectorDBService with index: {index_name} ({mode})")
+    
+    def _open_local(self, path: Path) -> LocalVectorIndex:
+        return LocalVectorIndex(
+            str(path),
+            dim=self.dimension,
+            ivf_threshold=getattr(config, 'LOCAL_VECTOR_INDEX_IVF_THRESHOLD', 50000),
+            nprobe=getattr(config, 'LOCAL_VECTOR_INDEX_NPROBE', 16),
+            compression=getattr(config, 'LOCAL_VECTOR_INDEX_COMPRESSION', None)
+        )
     
     def _ensure_index_exists(self):
         """Create index if it doesn't exist."""
@@ -50,43 +212,234 @@ class VectorDBService:
         else:
             logger.info(f"Using existing index: {self.index_name}")
     
+    def _batches(
+        self,
+        vectors: Iterable[Dict[str, Any]],
+        batch_size: int,
+        max_batch_bytes: int
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Group vectors into batches capped by count and serialized size.
+        
+        The size of each vector is bounded rather than measured: its values
+        count JSON_FLOAT_BYTES each, and only the id and metadata are
+        serialized.
+        """
+        batch, batch_bytes = [], 0
+        for vector in vectors:
+            item = {**vector, "values": _as_float_list(vector["values"])}
+            rest = {key: value for key, value in item.items() if key != "values"}
+            item_bytes = (
+                len(item["values"]) * JSON_FLOAT_BYTES
+                + len(json.dumps(rest, separators=(",", ":"), default=str).encode("utf-8"))
+            )
+            if batch and (len(batch) >= batch_size or batch_bytes + item_bytes > max_batch_bytes):
+                yield batch
+                batch, batch_bytes = [], 0
+            batch.append(item)
+            batch_bytes += item_bytes
+        if batch:
+            yield batch
+    
+    def _upsert_batch(self, batch: List[Dict[str, Any]], number: int, max_retries: int) -> int:
+        """Upsert one batch, retrying transient failures with jittered exponential backoff."""
+        for attempt in range(max_retries + 1):
+            try:
+                result = self.index.upsert(vectors=batch)
+                upserted = result.get('upserted_count', len(batch))
+                logger.debug(f"Upserted batch {number}: {upserted} vectors")
+                return upserted
+            except Exception as e:
+                if attempt == max_retries or not _is_transient(e):
+                    logger.error(f"Error upserting batch {number}: {e}")
+                    raise
+                delay = backoff_delay(attempt, e, UPSERT_BASE_BACKOFF, UPSERT_MAX_BACKOFF)
+                logger.warning(
+                    f"Upsert of batch {number} failed ({e}), "
+                    f"retry {attempt + 1}/{max_retries} in {delay:.2f}s"
+                )
+                time.sleep(delay)
+    
     def upsert_vectors(
         self,
-        vectors: List[Dict[str, Any]],
-        batch_size: int = 100
+        vectors: Iterable[Dict[str, Any]],
+        batch_size: int = 100,
+        max_batch_bytes: int = getattr(config, 'PINECONE_UPSERT_MAX_BYTES', 1800000),
+        max_workers: int = getattr(config, 'PINECONE_UPSERT_CONCURRENCY', 4),
+        max_retries: int = getattr(config, 'PINECONE_UPSERT_MAX_RETRIES', 3)
     ) -> Dict[str, int]:
         """
         Upsert vectors to Pinecone.
         
+        Vectors are consumed lazily and batches are sent on a bounded
+        thread pool, so a generator over the whole corpus can be upserted
+        at network throughput with only a few batches in memory at once.
+        
         Args:
-            vectors: List of vector dicts with 'id', 'values', 'metadata'
-            batch_size: Batch size for upsert
+            vectors: Iterable of vector dicts with 'id', 'values', 'metadata'
+            batch_size: Maximum vectors per request
+            max_batch_bytes: Maximum serialized size per request (Pinecone
+                rejects requests over 2 MB)
+            max_workers: Upsert requests in flight at once
+            max_retries: Retries per batch after the first attempt
             
         Returns:
             Dict with upsert statistics
         """
-        if not vectors:
+        total_upserted = 0
+        batches = 0
+        in_flight = deque()
+        
+        def collect():
+            # Mirror into the local index once Pinecone has accepted the batch
+            nonlocal total_upserted
+            future, batch = in_flight.popleft()
+            total_upserted += future.result() if future is not None else len(batch)
+            if self.local is not None:
+                self.local.upsert(batch)
+        
+        failed = False
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                for batch in self._batches(vectors, batch_size, max_batch_bytes):
+                    batches += 1
+                    future = None
+                    if self.index is not None:
+                        future = executor.submit(self._upsert_batch, batch, batches, max_retries)
+                    in_flight.append((future, batch))
+                    # Bound memory: keep at most two batches per worker queued
+                    while len(in_flight) >= 2 * max_workers:
+                        collect()
+                while in_flight:
+                    collect()
+            except Exception:
+                for future, _ in in_flight:
+                    if future is not None:
+                        future.cancel()
+                # Pinecone may hold batches the mirror never received
+                failed = self.index is not None
+                raise
+            finally:
+                # Saved once at the end, merged with any copy another process saved meanwhile
+                if self.local is not None and batches:
+                    self.local.save(complete=False if failed else None)
+        
+        if not batches:
             logger.warning("No vectors to upsert")
             return {"upserted": 0}
         
-        total_upserted = 0
+        self._invalidate_search_cache()
+        
+        logger.info(f"Total upserted: {total_upserted} vectors in {batches} batches")
+        return {"upserted": total_upserted, "batches": batches}
+    
+    def search_generation(self) -> int:
+        """
+        Current cache generation of this index, shared through Redis.
+        
+        Re-read at most every SEARCH_GENERATION_CHECK_INTERVAL seconds, so
+        writes made by other processes take effect within that delay.
+        """
+        now = time.monotonic()
+        checked_at = self._generation_checked_at
+        if checked_at is None or now - checked_at >= SEARCH_GENERATION_CHECK_INTERVAL:
+            generation = cache_manager.get_counter(self._generation_key)
+            if generation is not None:
+                self._generation = max(self._generation, generation)
+            self._generation_checked_at = now
+        return self._generation
+    
+    def _invalidate_search_cache(self):
+        """
+        Retire cached search results for this index after it changed.
+        
+        Increments the generation in every search cache key instead of
+        deleting keys; the old entries are never read again and expire.
+        """
+        generation = cache_manager.incr(self._generation_key)
+        self._generation = generation if generation is not None else self._generation + 1
+        self._generation_checked_at = time.monotonic()
+        logger.debug(f"Search cache generation of {self.index_name} is now {self._generation}")
+    
+    def _use_local(self) -> bool:
+        """Whether searches should go to the local index (offline, or a complete mirror)."""
+        if self.local is None:
+            return False
+        if self.index is None:
+            return True
+        self.local.refresh()
+        return self.local.complete
+    
+    def _pinecone_query(
+        self,
+        vector: Union[List[float], np.ndarray],
+        top_k: int,
+        filter_dict: Optional[Dict],
+        include_metadata: bool
+    ) -> List[Dict[str, Any]]:
+        results = self.index.query(
+            vector=_as_float_list(vector),
+            top_k=top_k,
+            include_metadata=include_metadata,
+            include_values=False,
+            filter=filter_dict
+        )
         
-        # Batch upsert
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
+        return [
+            {
+                "id": match["id"],
+                "score": match["score"],
+                "metadata": match.get("metadata", {})
+            }
+            for match in results.get("matches", [])
+        ]
+    
+    def _query(
+        self,
+        vector: Union[List[float], np.ndarray],
+        top_k: int,
+        filter_dict: Optional[Dict],
+        include_metadata: bool
+    ) -> List[Dict[str, Any]]:
+        """Query the local index when it is populated, otherwise Pinecone."""
+        if self._use_local():
             try:
-                result = self.index.upsert(vectors=batch)
-                upserted = result.get('upserted_count', len(batch))
-                total_upserted += upserted
-                logger.debug(f"Upserted batch {i//batch_size + 1}: {upserted} vectors")
+                return self.local.query(
+                    np.asarray(vector, dtype=np.float32),
+                    top_k=top_k,
+                    filter_dict=filter_dict,
+                    include_metadata=include_metadata
+                )
             except Exception as e:
-                logger.error(f"Error upserting batch {i//batch_size + 1}: {e}")
-                raise
+                if self.index is None:
+                    raise
+                logger.warning(f"Local index query failed, falling back to Pinecone: {e}")
         
-        logger.info(f"Total upserted: {total_upserted} vectors")
-        return {"upserted": total_upserted}
+        return self._pinecone_query(vector, top_k, filter_dict, include_metadata)
+    
+    def _query_many(
+        self,
+        matrix: np.ndarray,
+        top_k: int,
+        filters: List[Optional[Dict]],
+        include_metadata: bool,
+        max_workers: int
+    ) -> List[List[Dict[str, Any]]]:
+        """Query many vectors: one batched local pass, or concurrent Pinecone queries."""
+        if self._use_local():
+            try:
+                return self.local.query_many(matrix, top_k, filters, include_metadata)
+            except Exception as e:
+                if self.index is None:
+                    raise
+                logger.warning(f"Local index query failed, falling back to Pinecone: {e}")
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(matrix)))) as executor:
+            return list(executor.map(
+                lambda args: self._pinecone_query(args[0], top_k, args[1], include_metadata),
+                zip(matrix, filters)
+            ))
     
-    @cached(prefix="vector_search", ttl=config.CACHE_TTL_SEARCH_RESULTS)
     def search(
         self,
         query_text: str,
@@ -97,6 +450,10 @@ class VectorDBService:
         """
         Search for similar vectors using text query.
         
+        Results are cached under search_cache_key, fetched at
+        cache_top_k(top_k) results and trimmed, so smaller requests for the
+        same query reuse the entry.
+        
         Args:
             query_text: Query text
             top_k: Number of results to return
@@ -106,70 +463,147 @@ class VectorDBService:
         Returns:
             List of matches with id, score, and metadata
         """
+        matches = self._cached_search(
+            query_text, cache_top_k(top_k), canonical_filter(filter_dict), include_metadata
+        )
+        return matches[:top_k]
+    
+    @cached(
+        prefix=SEARCH_CACHE_PREFIX,
+        ttl=SEARCH_CACHE_TTL,
+        stale_ttl=SEARCH_CACHE_STALE_TTL,
+        key_builder=search_cache_key
+    )
+    def _cached_search(
+        self,
+        query_text: str,
+        top_k: int,
+        filter_dict: Optional[Dict],
+        include_metadata: bool
+    ) -> List[Dict[str, Any]]:
         try:
             # Generate query embedding
             logger.debug(f"Searching for: {query_text[:50]}...")
             query_vector = embedding_service.embed_single(query_text)
             
-            # Search Pinecone
-            results = self.index.query(
-                vector=query_vector,
-                top_k=top_k,
-                include_metadata=include_metadata,
-                include_values=False,
-                filter=filter_dict
-            )
-            
-            matches = results.get("matches", [])
+            # Search the local mirror or Pinecone
+            matches = self._query(query_vector, top_k, filter_dict, include_metadata)
             logger.info(f"Found {len(matches)} matches for query")
             
-            return [
-                {
-                    "id": match["id"],
-                    "score": match["score"],
-                    "metadata": match.get("metadata", {})
-                }
-                for match in matches
-            ]
+            return matches
         except Exception as e:
             logger.error(f"Error in vector search: {e}")
             raise
     
     def search_by_vector(
         self,
-        query_vector: List[float],
+        query_vector: Union[List[float], np.ndarray],
         top_k: int = config.TOP_K,
         filter_dict: Optional[Dict] = None
     ) -> List[Dict[str, Any]]:
         """Search using a pre-computed vector."""
         try:
-            results = self.index.query(
-                vector=query_vector,
-                top_k=top_k,
-                include_metadata=True,
-                include_values=False,
-                filter=filter_dict
-            )
-            
-            matches = results.get("matches", [])
+            matches = self._query(query_vector, top_k, filter_dict, True)
             logger.info(f"Found {len(matches)} matches")
             
-            return [
-                {
-                    "id": match["id"],
-                    "score": match["score"],
-                    "metadata": match.get("metadata", {})
-                }
-                for match in matches
-            ]
+            return matches
         except Exception as e:
             logger.error(f"Error in vector search: {e}")
             raise
     
+    def search_many(
+        self,
+        queries: Sequence[str],
+        top_k: int = config.TOP_K,
+        filter_dict: Union[None, Dict, List[Optional[Dict]]] = None,
+        include_metadata: bool = True,
+        max_workers: int = getattr(config, 'VECTOR_SEARCH_CONCURRENCY', 8)
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for many text queries at once.
+        
+        Cached results are fetched in one round trip; the remaining
+        queries are embedded in one batched call, then searched
+        concurrently (or in one matrix product against the local index).
+        
+        Args:
+            queries: Query texts
+            top_k: Number of results per query
+            filter_dict: One metadata filter for all queries, or a list
+                with one filter (or None) per query
+            include_metadata: Whether to include metadata
+            max_workers: Pinecone queries in flight at once
+            
+        Returns:
+            One list of matches per query, aligned with queries
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        filters = [canonical_filter(f) for f in _filters_for(filter_dict, len(queries))]
+        fetch_k = cache_top_k(top_k)
+        try:
+            # Serve what the cache has; search only the misses
+            keys = [
+                f"{SEARCH_CACHE_PREFIX}:{search_cache_key(self, query, fetch_k, f, include_metadata)}"
+                for query, f in zip(queries, filters)
+            ]
+            cached = cache_manager.get_many_with_ttl(keys)
+            results = [result for result, _ in cached]
+            for i, (result, remaining) in enumerate(cached):
+                if result is not None and remaining is not None and remaining <= SEARCH_CACHE_STALE_TTL:
+                    # Past its ttl: serve it and refresh it as search() would
+                    results[i] = self._cached_search(queries[i], fetch_k, filters[i], include_metadata)
+            missing = [i for i, result in enumerate(results) if result is None]
+            if missing:
+                vectors = embedding_service.embed_batch([queries[i] for i in missing], persist=False)
+                matrix = np.vstack([np.asarray(vector, dtype=np.float32) for vector in vectors])
+                fresh = self._query_many(
+                    matrix, fetch_k, [filters[i] for i in missing], include_metadata, max_workers
+                )
+                cache_manager.set_many(
+                    [(keys[i], result) for i, result in zip(missing, fresh)],
+                    ttl=SEARCH_CACHE_TTL + SEARCH_CACHE_STALE_TTL
+                )
+                for i, result in zip(missing, fresh):
+                    results[i] = result
+            logger.info(f"Searched {len(queries)} queries ({len(queries) - len(missing)} cached)")
+            return [result[:top_k] for result in results]
+        except Exception as e:
+            logger.error(f"Error in batched vector search: {e}")
+            raise
+    
+    def search_by_vectors(
+        self,
+        query_vectors: Union[Sequence[Sequence[float]], np.ndarray],
+        top_k: int = config.TOP_K,
+        filter_dict: Union[None, Dict, List[Optional[Dict]]] = None,
+        include_metadata: bool = True,
+        max_workers: int = getattr(config, 'VECTOR_SEARCH_CONCURRENCY', 8)
+    ) -> List[List[Dict[str, Any]]]:
+        """Search using pre-computed vectors (one row per query); see search_many."""
+        matrix = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        if not matrix.size:
+            return []
+        try:
+            results = self._query_many(
+                matrix, top_k, _filters_for(filter_dict, len(matrix)), include_metadata, max_workers
+            )
+            logger.info(f"Searched {len(matrix)} vectors")
+            return results
+        except Exception as e:
+            logger.error(f"Error in batched vector search: {e}")
+            raise
+    
     def delete_vectors(self, ids: List[str]) -> Dict[str, Any]:
         """Delete vectors by IDs."""
         try:
-            self.index.delete(ids=ids)
+            if self.index is not None:
+                self.index.delete(ids=ids)
+            if self.local is not None:
+                self.local.delete(ids)
+                self.local.save()
+            self._invalidate_search_cache()
             logger.info(f"Deleted {len(ids)} vectors")
             return {"deleted": len(ids)}
         except Exception as e:
@@ -179,13 +613,47 @@ class VectorDBService:
     def get_index_stats(self) -> Dict[str, Any]:
         """Get index statistics."""
         try:
-            stats = self.index.describe_index_stats()
+            stats = self.index.describe_index_stats() if self.index is not None else self.local.stats()
             logger.info(f"Index stats: {stats}")
             return stats
         except Exception as e:
             logger.error(f"Error getting index stats: {e}")
             raise
 
+    
+    def sync_local_index(self, batch_size: int = 100) -> Dict[str, int]:
+        """
+        Rebuild the local index from every vector stored in Pinecone.
+
+        The copy is built in a separate directory and swapped in when
+        complete; only then do searches in local mode use the mirror.
+
+        Args:
+            batch_size: IDs fetched per request
+            
+        Returns:
+            Dict with the number of vectors mirrored
+        """
+        if self.local is None or self.index is None:
+            raise RuntimeError("sync_local_index needs both Pinecone and a local index (mode='local')")
+        
+        # Build the new mirror next to the live one, which keeps serving until the swap
+        building_path = self.local.path.with_name(f"{self.local.path.name}.building")
+        shutil.rmtree(building_path, ignore_errors=True)
+        building = self._open_local(building_path)
+        synced = 0
+        for ids in self.index.list(limit=batch_size):
+            fetched = self.index.fetch(ids=list(ids)).vectors
+            synced += building.upsert(
+                {"id": vector.id, "values": vector.values, "metadata": vector.metadata or {}}
+                for vector in fetched.values()
+            )
+        building.complete = True
+        self.local.replace_with(building)
+        self._invalidate_search_cache()
+        logger.info(f"Mirrored {synced} vectors from Pinecone into the local index")
+        return {"synced": synced}
+
 
-# Global instance
-vector_db_service = VectorDBService()
\ No newline at end of file
+# Global instance (connects on first use)
+vector_db_service = LazyProxy(VectorDBService, "vector_db_service")
\ No newline at end of file
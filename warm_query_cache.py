@@ -0,0 +1,159 @@
+# warm_query_cache.py
+import argparse
+import json
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import config
+from logger import get_logger
+from services.embedding_service import embedding_service, normalize_text
+
+logger = get_logger(__name__)
+
+QUERY_FIELDS = ("query", "question", "text", "title")
+
+
+def load_queries(paths: Iterable[str]) -> List[str]:
+    """
+    Read queries from log files.
+
+    JSONL lines contribute their first "query", "question", "text" or
+    "title" field (the chat query log and request batches both work);
+    any other non-empty line is taken as a plain-text query.
+    """
+    queries = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    queries.append(line)
+                    continue
+                if isinstance(record, dict):
+                    query = next((record[field] for field in QUERY_FIELDS if record.get(field)), None)
+                    if isinstance(query, str):
+                        queries.append(query)
+                elif isinstance(record, str):
+                    queries.append(record)
+    return queries
+
+
+def count_queries(queries: List[str]) -> Counter:
+    """Count queries after the embedding service's normalization."""
+    counts = Counter(normalize_text(query, embedding_service.normalization) for query in queries)
+    counts.pop("", None)
+    return counts
+
+
+def measure_hit_rate(counts: Counter, batch_size: int = 1000) -> float:
+    """
+    Share of logged traffic whose embedding is already stored or cached.
+
+    Each distinct query is looked up once and weighted by its frequency.
+    """
+    total = sum(counts.values())
+    if not total:
+        return 0.0
+    texts = list(counts)
+    hits = 0
+    for i in range(0, len(texts), batch_size):
+        batch = texts[i:i + batch_size]
+        for text, available in zip(batch, embedding_service.is_available_many(batch)):
+            if available:
+                hits += counts[text]
+    return hits / total
+
+
+def warm(paths: List[str], top_n: int) -> Dict[str, float]:
+    """
+    Pre-embed the most frequent logged queries and refresh their cache TTLs.
+
+    Returns:
+        Report with the number of queries warmed, how many needed an
+        embedding call, and the traffic-weighted hit rate of the logged
+        queries before and after warming
+    """
+    counts = count_queries(load_queries(paths))
+    total = sum(counts.values())
+    ranked = counts.most_common(top_n)
+    if not ranked:
+        logger.warning("No queries found to warm")
+        return {
+            "logged_queries": total,
+            "distinct_queries": 0,
+            "warmed": 0,
+            "computed": 0,
+            "hit_rate_before": 0.0,
+            "hit_rate_after": 0.0,
+        }
+
+    hit_rate_before = measure_hit_rate(counts)
+
+    texts = [query for query, _ in ranked]
+    before = embedding_service.get_stats()["computed"]
+    embedding_service.embed_batch(texts)
+    computed = embedding_service.get_stats()["computed"] - before
+
+    # Extend every entry so hot queries never age out of Redis between runs
+    embedding_service.refresh_cache_ttl(texts)
+
+    report = {
+        "logged_queries": total,
+        "distinct_queries": len(counts),
+        "warmed": len(texts),
+        "computed": computed,
+        "hit_rate_before": hit_rate_before,
+        "hit_rate_after": measure_hit_rate(counts),
+    }
+    logger.info(
+        f"Warmed {len(texts)} queries ({computed} newly embedded); hit rate over "
+        f"{total} logged queries {hit_rate_before:.1%} -> {report['hit_rate_after']:.1%}"
+    )
+    return report
+
+
+def default_query_logs() -> List[str]:
+    """The chat query log (QUERY_LOG_PATH) and its rotated backups, if logging is on."""
+    path = getattr(config, 'QUERY_LOG_PATH', None)
+    if not path:
+        return []
+    backups = range(1, getattr(config, 'QUERY_LOG_BACKUP_COUNT', 5) + 1)
+    return [path] + [f"{path}.{i}" for i in backups]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-embed frequent queries into the embedding cache")
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        default=default_query_logs(),
+        help="Query logs or JSONL request batches (default: the chat query log and its backups)"
+    )
+    parser.add_argument("--top", type=int, default=1000, help="Number of most frequent queries to warm")
+    parser.add_argument("--interval", type=float, default=0, help="Repeat every N seconds (0 runs once)")
+    args = parser.parse_args()
+
+    paths = [path for path in args.paths if Path(path).exists()]
+    if not paths:
+        parser.error(f"no query logs found: {', '.join(args.paths) or 'QUERY_LOG_PATH is not set'}")
+
+    while True:
+        report = warm(paths, args.top)
+        print(
+            f"warmed {report['warmed']} of {report['distinct_queries']} distinct queries "
+            f"({report['computed']} newly embedded), "
+            f"hit rate {report['hit_rate_before']:.1%} -> {report['hit_rate_after']:.1%}"
+        )
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
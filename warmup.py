@@ -0,0 +1,173 @@
+# warmup.py
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import config
+from cache_manager import cache_manager
+from lazy_proxy import resolve
+from logger import get_logger
+from services.embedding_service import embedding_service
+from services.graph_db_service import graph_db_service
+from services.openai_client import get_openai_client
+from services.vector_db_service import vector_db_service
+
+logger = get_logger(__name__)
+
+
+def _concurrently(func: Callable[[], Any], times: int):
+    """Run func on `times` threads at once so each holds its own pooled connection."""
+    with ThreadPoolExecutor(max_workers=times) as executor:
+        for future in [executor.submit(func) for _ in range(times)]:
+            future.result()
+
+
+def _warm_redis(pool_size: int) -> str:
+    manager = resolve(cache_manager)
+    if not manager.is_available():
+        raise RuntimeError("no cache backend available")
+    if manager.backend != getattr(config, 'CACHE_BACKEND', "redis"):
+        # Serving from the in-process fallback: caches are not shared, so report it as down
+        raise RuntimeError(f"Redis unreachable, degraded to the '{manager.backend}' fallback")
+    _concurrently(manager.client.ping, pool_size if manager.backend == "redis" else 1)
+    return manager.backend
+
+
+def _warm_pinecone(pool_size: int) -> str:
+    service = resolve(vector_db_service)
+    if service.index is None:
+        return f"offline, {len(service.local)} local vectors"
+    _concurrently(service.index.describe_index_stats, pool_size)
+    return service.index_name
+
+
+def _warm_neo4j(pool_size: int) -> str:
+    service = resolve(graph_db_service)
+
+    def ping():
+        with service.driver.session() as session:
+            session.run("RETURN 1").consume()
+
+    _concurrently(ping, pool_size)
+    return f"{pool_size} sessions"
+
+
+def _warm_openai(pool_size: int) -> str:
+    client = get_openai_client().client
+    model = getattr(config, 'CHAT_MODEL', None) or config.EMBED_MODEL
+    _concurrently(lambda: client.models.retrieve(model), min(pool_size, 2))
+    return model
+
+
+def _warm_embeddings(pool_size: int) -> str:
+    service = resolve(embedding_service)
+    return f"{len(service.store) if service.store is not None else 0} stored vectors"
+
+
+BACKENDS: Dict[str, Callable[[int], str]] = {
+    "redis": _warm_redis,
+    "pinecone": _warm_pinecone,
+    "neo4j": _warm_neo4j,
+    "openai": _warm_openai,
+    "embeddings": _warm_embeddings,
+}
+
+
+def warmup(
+    backends: Optional[List[str]] = None,
+    pool_size: int = getattr(config, 'WARMUP_POOL_SIZE', 4),
+    preload_queries: Optional[List[str]] = None,
+    preload_top: int = getattr(config, 'WARMUP_PRELOAD_TOP', 200)
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Connect every backend concurrently and prime its connection pool.
+
+    Start-up then takes as long as the slowest dependency rather than the
+    sum of all of them, and a dead backend is reported up front instead of
+    on the first query.
+
+    Args:
+        backends: Names from BACKENDS to warm (default: all)
+        pool_size: Connections opened per pooled backend
+        preload_queries: Query logs whose most frequent queries are
+            embedded into the cache once the backends are up
+        preload_top: Number of queries to preload
+
+    Returns:
+        Per-backend dict with "ok", "seconds" and "detail" or "error"
+        (plus "preload" when preloading ran)
+    """
+    names = backends or list(BACKENDS)
+
+    def probe(name):
+        start = time.perf_counter()
+        try:
+            detail = BACKENDS[name](pool_size)
+            return name, {"ok": True, "seconds": time.perf_counter() - start, "detail": detail}
+        except Exception as e:
+            logger.error(f"Warm-up of {name} failed: {e}")
+            return name, {"ok": False, "seconds": time.perf_counter() - start, "error": str(e)}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(names)) as executor:
+        report = dict(executor.map(probe, names))
+    logger.info(
+        f"Warmed {sum(result['ok'] for result in report.values())}/{len(names)} "
+        f"backends in {time.perf_counter() - start:.2f}s"
+    )
+
+    paths = [path for path in preload_queries or [] if Path(path).exists()]
+    if paths:
+        from warm_query_cache import warm
+
+        preload_start = time.perf_counter()
+        try:
+            detail = warm(paths, preload_top)
+            report["preload"] = {"ok": True, "seconds": time.perf_counter() - preload_start, "detail": detail}
+        except Exception as e:
+            logger.error(f"Cache preload failed: {e}")
+            report["preload"] = {"ok": False, "seconds": time.perf_counter() - preload_start, "error": str(e)}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Connect to all backends and report readiness")
+    parser.add_argument("backends", nargs="*", help=f"Backends to warm (default: all): {', '.join(BACKENDS)}")
+    parser.add_argument("--pool-size", type=int, default=getattr(config, 'WARMUP_POOL_SIZE', 4))
+    parser.add_argument(
+        "--preload",
+        nargs="?",
+        const="",
+        help="Also embed the most frequent queries from this log (default: the chat query log and its backups)"
+    )
+    parser.add_argument("--top", type=int, default=getattr(config, 'WARMUP_PRELOAD_TOP', 200))
+    args = parser.parse_args()
+
+    unknown = [name for name in args.backends if name not in BACKENDS]
+    if unknown:
+        parser.error(f"unknown backend(s): {', '.join(unknown)}")
+
+    preload_queries = None
+    if args.preload:
+        preload_queries = [args.preload]
+    elif args.preload is not None:
+        from warm_query_cache import default_query_logs
+        preload_queries = default_query_logs()
+
+    report = warmup(
+        args.backends,
+        pool_size=args.pool_size,
+        preload_queries=preload_queries,
+        preload_top=args.top
+    )
+    for name, result in report.items():
+        status = "ready" if result["ok"] else "FAILED"
+        info = result.get("detail") if result["ok"] else result["error"]
+        print(f"{name:<11} {status:<6} {result['seconds'] * 1e3:8.1f} ms  {info}")
+    raise SystemExit(0 if all(result["ok"] for result in report.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()